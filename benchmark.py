@@ -0,0 +1,441 @@
+"""
+Бенчмарк парсера вакансий без обращения к api.hh.ru.
+
+Запускает локальный сервер, имитирующий /vacancies, /vacancies/{id} и /employers/{id}
+с настраиваемыми задержкой, долей ошибок и числом страниц, и временную базу PostgreSQL,
+после чего выполняет parse_vacancies из main.py и сообщает запросы/с, строки/с,
+p50/p99 задержки по эндпоинтам и пиковое потребление памяти.
+
+Примеры:
+
+    python benchmark.py --latency 0.05 --error-rate 0.01 --json baseline.json
+    python benchmark.py --latency 0.05 --error-rate 0.01 --baseline baseline.json
+
+База данных: по умолчанию временный кластер создается через initdb/pg_ctl
+(должны быть в PATH или в --pg-bin; initdb не запускается от root). Вместо этого
+можно передать --dsn существующего сервера - в нем будет создана и затем удалена
+временная база.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import psycopg2
+import psycopg2.extensions
+from requests.adapters import HTTPAdapter
+
+import main
+
+# Сервер-заглушка API hh.ru: ответы детерминированы параметрами запроса и seed,
+# поэтому повторные прогоны с одинаковыми параметрами получают одинаковые данные
+class MockApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    options = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode()
+        etag = f'"{zlib.crc32(data):08x}"'
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        options = self.options
+        if options['latency']:
+            time.sleep(random.expovariate(1 / options['latency']))
+        if random.random() < options['error_rate']:
+            return self.send_json(503, {'errors': [{'type': 'service_unavailable'}]})
+
+        url = urlparse(self.path)
+        if url.path == '/vacancies':
+            return self.send_json(200, self.search_page(parse_qs(url.query)))
+        match = re.fullmatch(r'/vacancies/(\d+)', url.path)
+        if match:
+            return self.send_json(200, self.vacancy(int(match.group(1))))
+        match = re.fullmatch(r'/employers/(\d+)', url.path)
+        if match:
+            return self.employer(int(match.group(1)))
+        if url.path == '/dictionaries':
+            return self.send_json(200, {'currency': [
+                {'code': 'RUR', 'rate': 1.0}, {'code': 'USD', 'rate': 0.0105}, {'code': 'EUR', 'rate': 0.0098}
+            ]})
+        self.send_json(404, {'errors': [{'type': 'not_found'}]})
+
+    # Выдача пары (запрос, город) - pages * per_page вакансий, опубликованных равномерно за последние
+    # days дней (сначала новые); date_from и date_to сужают выдачу, как в API, а глубже max_results
+    # страницы не отдаются, поэтому парсеру приходится делить поиск по датам
+    def search_page(self, query):
+        options = self.options
+        text = query.get('text', [''])[0]
+        area = int(query.get('area', ['1'])[0])
+        page = int(query.get('page', ['0'])[0])
+        per_page = int(query.get('per_page', ['100'])[0])
+        total = options['pages'] * per_page
+        step = options['days'] * 86400 / total
+
+        # Номера вакансий выдачи, попадающих в диапазон дат: [first, last)
+        first, last = 0, total
+        if 'date_to' in query:
+            age = options['started_at'] - parse_date(query['date_to'][0])
+            first = max(first, math.ceil(age / step) - 1)
+        if 'date_from' in query:
+            age = options['started_at'] - parse_date(query['date_from'][0])
+            last = min(last, math.floor(age / step))
+        found = max(0, last - first)
+        pages = min(math.ceil(found / per_page), options['max_results'] // per_page)
+
+        items = []
+        if page < pages:
+            for index in range(first + page * per_page, min(last, first + (page + 1) * per_page)):
+                items.append(self.search_item(text, area, index, options['started_at'] - (index + 1) * step))
+        return {'items': items, 'pages': pages, 'found': found, 'page': page}
+
+    def search_item(self, text, area, index, published_at):
+        options = self.options
+        rng = random.Random(zlib.crc32(f"{options['seed']}:{text}:{area}:{index}".encode()))
+        # Общий пул id дает пересечение выдачи разных запросов, как у настоящего API
+        vacancy_id = rng.randrange(options['pool'])
+        employer_id = min(int(rng.paretovariate(1.2)), options['employers'])
+        matches = rng.random() >= options['mismatch']
+        return {
+            'id': str(vacancy_id),
+            'name': f"{text} #{vacancy_id}" if matches else f"Вакансия #{vacancy_id}",
+            'snippet': {'requirement': f"Опыт <highlighttext>{text}</highlighttext> от года"},
+            'employer': {'id': str(employer_id), 'name': f"Компания {employer_id}"},
+            'experience': {'id': 'between1And3', 'name': 'От 1 года до 3 лет'},
+            'salary': None if vacancy_id % 3 == 0 else {
+                'from': 100000 + vacancy_id % 200000, 'to': None, 'gross': False,
+                'currency': ('RUR', 'RUR', 'RUR', 'USD', 'EUR')[vacancy_id % 5]
+            },
+            'alternate_url': f"https://hh.ru/vacancy/{vacancy_id}",
+            'published_at': datetime.fromtimestamp(int(published_at), timezone.utc).strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'area': {'id': str(area)},
+        }
+
+    def vacancy(self, vacancy_id):
+        rng = random.Random(vacancy_id)
+        skills = rng.sample(['Python', 'python3', 'SQL', 'Pandas', 'Spark', 'Airflow', 'Docker', 'Git', 'Tableau', 'postgres'], 3)
+        return {'id': str(vacancy_id), 'key_skills': [{'name': skill} for skill in skills]}
+
+    def employer(self, employer_id):
+        if employer_id % 17 == 0:
+            return self.send_json(404, {'errors': [{'type': 'not_found'}]})
+        return self.send_json(200, {'id': str(employer_id), 'industries': [{'name': f"Отрасль {employer_id % 12}"}]})
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z').timestamp()
+
+def serve_mock_api(port, options):
+    MockApiHandler.options = options
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockApiHandler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Сервер на порту {port} не запустился")
+
+# Временный кластер PostgreSQL в каталоге tmpdir, удаляемый после бенчмарка
+class TemporaryPostgres:
+    def __init__(self, pg_bin=None):
+        self.pg_bin = pg_bin
+        self.datadir = None
+
+    def tool(self, name):
+        path = os.path.join(self.pg_bin, name) if self.pg_bin else shutil.which(name)
+        if not path or not os.path.exists(path):
+            raise RuntimeError(f"Не найден {name}: укажите --pg-bin или --dsn")
+        return path
+
+    def __enter__(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='hh_bench_pg_')
+        self.datadir = os.path.join(self.tmpdir, 'data')
+        self.port = free_port()
+        subprocess.run(
+            [self.tool('initdb'), '-D', self.datadir, '-U', 'postgres', '--auth=trust', '-E', 'UTF8'],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        subprocess.run(
+            [self.tool('pg_ctl'), '-D', self.datadir, '-w', '-l', os.path.join(self.tmpdir, 'postgres.log'),
+             '-o', f"-p {self.port} -k {self.tmpdir} -c listen_addresses=127.0.0.1 -c fsync=off", 'start'],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        return {'dbname': 'postgres', 'user': 'postgres', 'password': '', 'host': '127.0.0.1', 'port': str(self.port)}
+
+    def __exit__(self, *exc_info):
+        subprocess.run([self.tool('pg_ctl'), '-D', self.datadir, '-m', 'immediate', 'stop'],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+# Временная база на существующем сервере
+class TemporaryDatabase:
+    def __init__(self, dsn):
+        self.server_config = psycopg2.extensions.parse_dsn(dsn)
+        self.dbname = f"hh_bench_{os.getpid()}"
+
+    def execute(self, query):
+        conn = psycopg2.connect(**self.server_config)
+        conn.autocommit = True
+        try:
+            conn.cursor().execute(query)
+        finally:
+            conn.close()
+
+    def __enter__(self):
+        self.execute(f"CREATE DATABASE {self.dbname} ENCODING 'UTF8' TEMPLATE template0")
+        return dict(self.server_config, dbname=self.dbname)
+
+    def __exit__(self, *exc_info):
+        # Соединения main.py закрываются сборщиком мусора, поэтому удаляем базу принудительно
+        self.execute(f"DROP DATABASE IF EXISTS {self.dbname} WITH (FORCE)")
+
+# Адаптер HTTP-сессии main.py, замеряющий задержку каждого запроса по классам эндпоинтов
+class TimingAdapter(HTTPAdapter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.latencies = {}
+
+    @staticmethod
+    def endpoint(url):
+        path = urlparse(url).path
+        if path == '/vacancies':
+            return 'search'
+        if path.startswith('/vacancies/'):
+            return 'vacancy'
+        if path.startswith('/employers/'):
+            return 'employer'
+        if path == '/dictionaries':
+            return 'dictionary'
+        return 'other'
+
+    def send(self, request, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().send(request, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.latencies.setdefault(self.endpoint(request.url), []).append(elapsed)
+
+    def reset(self):
+        with self.lock:
+            latencies, self.latencies = self.latencies, {}
+        return latencies
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def count_rows(db_config):
+    conn = psycopg2.connect(**db_config)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM vacancies")
+            return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+# Запросы по эндпоинтам последнего запуска из итогов обработчиков (crawl_run_metrics): при нескольких
+# процессах запросы выполняются в дочерних процессах, мимо TimingAdapter. Обработчики сохраняют
+# только число и сумму задержек, поэтому p50/p99 по всем процессам не вычисляются
+def worker_endpoint_stats(db_config):
+    conn = psycopg2.connect(**db_config)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT metrics FROM crawl_run_metrics WHERE run_id = (SELECT MAX(id) FROM crawl_runs)")
+            summaries = [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+    totals = {}
+    for summary in summaries:
+        for series, value in summary.items():
+            match = re.fullmatch(r'hh_api_request_seconds\{endpoint="(\w+)"\}', series)
+            if match:
+                count, total = totals.get(match.group(1), (0, 0.0))
+                totals[match.group(1)] = (count + value['count'], total + value['sum'])
+    return {
+        endpoint: {'requests': count, 'mean_ms': total / count * 1000, 'p50_ms': None, 'p99_ms': None}
+        for endpoint, (count, total) in sorted(totals.items())
+    }
+
+def configure_main(args, api_url, db_config, workdir, adapter):
+    main.hh_api_url = api_url
+    main.db_config = db_config
+    main.employer_cache_config['path'] = os.path.join(workdir, 'employer_cache.sqlite3')
+    main.http_cache_config['path'] = os.path.join(workdir, 'http_cache.sqlite3')
+    main.http_cache_config['enabled'] = args.http_cache
+    main.shard_config['processes'] = args.processes
+    main.http_session.mount('http://', adapter)
+    if args.rate:
+        for limits in main.rate_limit_config['endpoints'].values():
+            limits['rate'] = limits['max_rate'] = args.rate
+    if args.cities:
+        main.cities = {f"Город {city_id}": city_id for city_id in range(1, args.cities + 1)}
+    if args.queries:
+        main.vacancies = [f"Запрос {number}" for number in range(1, args.queries + 1)]
+
+def run_benchmark(args, db_config):
+    port = free_port()
+    options = {
+        'latency': args.latency, 'error_rate': args.error_rate, 'pages': args.pages, 'pool': args.pool,
+        'employers': args.employers, 'mismatch': args.mismatch, 'seed': args.seed, 'days': args.days,
+        'max_results': main.search_config['max_results'], 'started_at': time.time()
+    }
+    server = multiprocessing.Process(target=serve_mock_api, args=(port, options), daemon=True)
+    server.start()
+    workdir = tempfile.mkdtemp(prefix='hh_bench_')
+    try:
+        wait_for_port(port)
+        adapter = TimingAdapter(pool_connections=4, pool_maxsize=main.fetch_config['concurrency'])
+        configure_main(args, f"http://127.0.0.1:{port}", db_config, workdir, adapter)
+
+        results = []
+        for run in range(1, args.runs + 1):
+            started = time.perf_counter()
+            main.parse_vacancies(incremental=args.incremental)
+            elapsed = time.perf_counter() - started
+            latencies = adapter.reset()
+            if args.processes > 1:
+                endpoints = worker_endpoint_stats(db_config)
+            else:
+                endpoints = {
+                    endpoint: {
+                        'requests': len(values),
+                        'mean_ms': sum(values) / len(values) * 1000,
+                        'p50_ms': percentile(values, 0.50) * 1000,
+                        'p99_ms': percentile(values, 0.99) * 1000,
+                    }
+                    for endpoint, values in sorted(latencies.items())
+                }
+            requests_made = sum(stats['requests'] for stats in endpoints.values())
+            rows = count_rows(db_config)
+            peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                           resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+            results.append({
+                'run': run,
+                'seconds': elapsed,
+                'requests': requests_made,
+                'requests_per_second': requests_made / elapsed,
+                'rows': rows,
+                'rows_per_second': rows / elapsed,
+                'peak_rss_mb': peak_rss / 1024,
+                'endpoints': endpoints,
+            })
+        return results
+    finally:
+        server.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def print_results(results):
+    for result in results:
+        print(f"Прогон {result['run']}: {result['seconds']:.1f} с, запросов {result['requests']} "
+              f"({result['requests_per_second']:.1f}/с), строк {result['rows']} ({result['rows_per_second']:.1f}/с), "
+              f"пиковая память {result['peak_rss_mb']:.0f} МБ")
+        for endpoint, stats in result['endpoints'].items():
+            quantiles = ''
+            if stats['p50_ms'] is not None:
+                quantiles = f"  p50 {stats['p50_ms']:8.1f} мс  p99 {stats['p99_ms']:8.1f} мс"
+            print(f"    {endpoint:<9} запросов {stats['requests']:>7}  "
+                  f"среднее {stats['mean_ms']:8.1f} мс{quantiles}")
+
+# Сравнение с сохраненным базовым результатом; возвращает True, если есть регрессия сверх допуска
+def compare_with_baseline(results, baseline, tolerance):
+    regression = False
+    for result, base in zip(results, baseline):
+        for metric, higher_is_better in (('requests_per_second', True), ('rows_per_second', True),
+                                         ('seconds', False), ('peak_rss_mb', False)):
+            if not base.get(metric):
+                continue
+            change = (result[metric] - base[metric]) / base[metric]
+            worse = -change if higher_is_better else change
+            marker = ' <- регрессия' if worse > tolerance else ''
+            regression = regression or worse > tolerance
+            print(f"Прогон {result['run']}: {metric} {base[metric]:.2f} -> {result[metric]:.2f} ({change:+.1%}){marker}")
+    return regression
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Бенчмарк парсера вакансий на локальной заглушке API hh.ru')
+    parser.add_argument('--latency', type=float, default=0.05, help='средняя задержка ответа заглушки, секунд')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 503')
+    parser.add_argument('--pages', type=int, default=3, help='страниц выдачи на запрос')
+    parser.add_argument('--days', type=float, default=60, help='за сколько дней опубликована выдача запроса')
+    parser.add_argument('--pool', type=int, default=5000, help='уникальных вакансий в выдаче')
+    parser.add_argument('--employers', type=int, default=500, help='уникальных работодателей')
+    parser.add_argument('--mismatch', type=float, default=0.1,
+                        help='доля вакансий, название которых не содержит запрос')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cities', type=int, help='число городов (по умолчанию - из main.py)')
+    parser.add_argument('--queries', type=int, help='число запросов (по умолчанию - из main.py)')
+    parser.add_argument('--rate', type=float,
+                        help='фиксированная частота запросов для всех эндпоинтов (по умолчанию - из main.py)')
+    parser.add_argument('--processes', type=int, default=1, help='процессов-обработчиков')
+    parser.add_argument('--incremental', action='store_true', help='инкрементальный режим обхода')
+    parser.add_argument('--runs', type=int, default=1, help='прогонов подряд (кэши сохраняются между ними)')
+    parser.add_argument('--no-http-cache', dest='http_cache', action='store_false',
+                        help='выключить кэш ответов API')
+    parser.add_argument('--dsn', help='строка подключения к существующему серверу PostgreSQL')
+    parser.add_argument('--pg-bin', help='каталог с initdb и pg_ctl для временного кластера')
+    parser.add_argument('--json', help='сохранить результаты в файл')
+    parser.add_argument('--baseline', help='сравнить с результатами из файла')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='допустимое ухудшение относительно базы')
+    args = parser.parse_args()
+    main.setup_logging()
+
+    database = TemporaryDatabase(args.dsn) if args.dsn else TemporaryPostgres(args.pg_bin)
+    with database as db_config:
+        results = run_benchmark(args, db_config)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline) as f:
+            if compare_with_baseline(results, json.load(f), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_cli()
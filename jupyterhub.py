@@ -25,6 +25,25 @@ Environment variables:
     TLJH_BOOTSTRAP_DEV          Determines if --editable is passed when
                                 installing the tljh installer. Pass the values
                                 yes or no.
+    TLJH_BOOTSTRAP_TAGS_SOURCE  Where TLJH release tags are listed: a git URL
+                                (e.g. an internal mirror) or a local file in
+                                `git ls-remote --tags` format or with one tag
+                                per line. Defaults to the GitHub repository.
+                                A git URL is also where the resolved version
+                                is pip installed from. With a tags file, set
+                                TLJH_BOOTSTRAP_PIP_SPEC to an installer
+                                reachable offline (and don't pass --version),
+                                or pip install still goes to GitHub.
+    TLJH_BOOTSTRAP_TAGS_CACHE   File caching tags fetched from a git URL.
+                                Defaults to "$TLJH_INSTALL_PREFIX/cache/tags.json";
+                                put it on shared storage so parallel bootstraps
+                                query upstream once.
+    TLJH_BOOTSTRAP_TAGS_TTL     Seconds a cached tag list stays fresh, default
+                                3600. A stale cache is still used when the
+                                source can't be reached.
+    TLJH_BOOTSTRAP_WHEELHOUSE   With --accelerated, a directory of pre-built
+                                wheels pip should prefer over downloads.
+                                Defaults to "$TLJH_INSTALL_PREFIX/wheelhouse".
 
 Command line flags, from "bootstrap.py --help":
 
@@ -41,18 +60,53 @@ Command line flags, from "bootstrap.py --help":
                             specified, for example '1', '1.0' or '1.0.0'. You
                             can also pass a branch name such as 'main' or a
                             commit hash.
+    --accelerated           Skips the second apt-get update when no apt source
+                            changed, resolves the TLJH version while apt runs,
+                            and points pip (here and in the tljh installer) at
+                            a persistent cache and wheelhouse under
+                            TLJH_INSTALL_PREFIX, for faster re-provisioning.
+    --fleet INVENTORY       Controller mode: instead of installing locally, run
+                            this script on every host of the inventory file,
+                            --fleet-parallel at a time, retrying failed hosts
+                            --fleet-retries times. Other flags are forwarded.
+                            Each inventory line is "<name> <transport> <target>
+                            [sudo=yes] [python=python3]", where transport is
+                            ssh (target user@host), docker (container name),
+                            chroot (directory) or local (target ignored).
+                            Output of each host goes to --fleet-log-dir.
+                            Only TLJH_BOOTSTRAP_DEV, TLJH_BOOTSTRAP_PIP_SPEC
+                            and a git URL in TLJH_BOOTSTRAP_TAGS_SOURCE are
+                            passed to the hosts. The controller caches tags in
+                            TLJH_BOOTSTRAP_TAGS_CACHE, default
+                            "~/.cache/tljh-bootstrap/tags.json".
 """
 
+import collections
+import fcntl
+import glob
+import hashlib
+import json
 import logging
 import multiprocessing
 import os
 import re
+import shlex
 import shutil
 import subprocess
 import sys
+import time
 import urllib.request
 from argparse import ArgumentParser
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from http.server import HTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    from http.server import ThreadingHTTPServer
+except ImportError:
+    # Python < 3.7 is refused in ensure_host_system_can_install_tljh
+    ThreadingHTTPServer = HTTPServer
 
 progress_page_favicon_url = "https://raw.githubusercontent.com/jupyterhub/jupyterhub/main/share/jupyterhub/static/favicon.ico"
 progress_page_html = """
@@ -61,15 +115,26 @@ progress_page_html = """
   <title>The Littlest Jupyterhub</title>
 </head>
 <body>
-  <meta http-equiv="refresh" content="30" >
   <meta http-equiv="content-type" content="text/html; charset=utf-8">
   <meta name="viewport" content="width=device-width">
   <img class="logo" src="https://raw.githubusercontent.com/jupyterhub/the-littlest-jupyterhub/HEAD/docs/_static/images/logo/logo.png">
   <div class="loader center"></div>
   <div class="center main-msg">Please wait while your TLJH is setting up...</div>
   <div class="center logs-msg">Click the button below to see the logs</div>
-  <div class="center tip" >Tip: to update the logs, refresh the page</div>
+  <div class="center tip" >Tip: the logs below update as the installation runs</div>
   <button class="logs-button center" onclick="window.location.href='/logs'">View logs</button>
+  <pre class="center logs" id="logs"></pre>
+  <script>
+    var logs = document.getElementById("logs");
+    var source = new EventSource("/logs/stream");
+    source.onmessage = function (event) {
+      var follow = logs.scrollTop + logs.clientHeight >= logs.scrollHeight - 5;
+      logs.textContent += event.data + "\n";
+      if (follow) {
+        logs.scrollTop = logs.scrollHeight;
+      }
+    };
+  </script>
 </body>
 
   <style>
@@ -112,6 +177,15 @@ progress_page_html = """
       cursor: pointer;
       background: #f5a252;
     }
+    .logs {
+      width: 90%;
+      height: 300px;
+      overflow: auto;
+      text-align: left;
+      font-size: 12px;
+      background: #f7f7f7;
+      padding: 10px;
+    }
     .loader {
       width: 150px;
       height: 150px;
@@ -137,22 +211,36 @@ progress_page_html = """
 
 logger = logging.getLogger(__name__)
 
+tljh_repo_url = "https://github.com/jupyterhub/the-littlest-jupyterhub.git"
+
 def _parse_version(vs: str) -> tuple[int]:
     return tuple(int(part) for part in vs.split("."))
 
-def run_subprocess(cmd: list[str], *args, **kwargs) -> str:
-    logger = logging.getLogger("tljh")
-    proc = subprocess.run(
-        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, *args, **kwargs
-    )
+def run_subprocess(
+    cmd: list[str], *args, capture: bool = False, tail_lines: int = 200, **kwargs
+) -> str:
+    """
+    Run a command, streaming its output line by line to the installer log as it
+    is produced. Only the last tail_lines lines are kept in memory, for the
+    error report and the return value, unless capture is set.
+    """
     printable_command = " ".join(cmd)
+    output = [] if capture else collections.deque(maxlen=tail_lines)
+    logger.debug("Running {command}".format(command=printable_command))
+    with subprocess.Popen(
+        cmd, *args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **kwargs
+    ) as proc:
+        for raw_line in proc.stdout:
+            line = raw_line.decode(errors="replace").rstrip("\n")
+            logger.debug(line)
+            output.append(line)
     if proc.returncode != 0:
         logger.error(
             "Ran {command} with exit code {code}".format(
                 command=printable_command, code=proc.returncode
             )
         )
-        logger.error(proc.stdout.decode())
+        logger.error("\n".join(output))
         raise subprocess.CalledProcessError(cmd=cmd, returncode=proc.returncode)
     else:
         logger.debug(
@@ -160,9 +248,30 @@ def run_subprocess(cmd: list[str], *args, **kwargs) -> str:
                 command=printable_command, code=proc.returncode
             )
         )
-        output = proc.stdout.decode()
-        logger.debug(output)
-        return output
+        return "\n".join(output)
+
+@contextmanager
+def timed_step(timings: list, name: str):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - start
+        timings.append((name, elapsed))
+        logger.info("{name} took {elapsed:.1f}s".format(name=name, elapsed=elapsed))
+
+def apt_sources_checksum() -> str:
+    """
+    Checksum of the apt source lists, to tell whether a step added a repository.
+    """
+    digest = hashlib.sha256()
+    paths = ["/etc/apt/sources.list"] + sorted(glob.glob("/etc/apt/sources.list.d/*"))
+    for path in paths:
+        if os.path.isfile(path):
+            digest.update(path.encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
 
 def get_os_release_variable(key: str) -> str:
     return (
@@ -204,59 +313,550 @@ def ensure_host_system_can_install_tljh():
     return distro, version
 
 class ProgressPageRequestHandler(SimpleHTTPRequestHandler):
-    # (Ваш код обработчика HTTP-запросов)
-
-def _find_matching_version(all_versions: set, requested: str) -> tuple[int]:
-    sorted_versions = sorted(all_versions, reverse=True)
-    if requested == "latest":
-        return sorted_versions[0]
-    components = len(requested)
-    for v in sorted_versions:
-        if v[:components] == requested:
-            return v
-    return None
-
-def _resolve_git_version(version: str) -> str:
-    if version != "latest" and not re.match(r"\d+(\.\d+)?(\.\d+)?$", version):
-        return version
+    """
+    Serves the progress page and the installer log. /logs?offset=N (or a
+    "Range: bytes=N-" header) returns only the log after byte N, with the next
+    offset in X-Log-Offset. /logs/stream follows the log as server-sent events.
+    """
+
+    stream_poll_interval = 1
+    stream_heartbeat_interval = 15
+
+    def log_path(self):
+        install_prefix = os.environ.get("TLJH_INSTALL_PREFIX", "/opt/tljh")
+        return os.path.join(install_prefix, "installer.log")
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/logs":
+            self.send_logs(url)
+        elif url.path == "/logs/stream":
+            self.stream_logs()
+        elif self.path == "/index.html":
+            self.path = "/var/run/index.html"
+            return SimpleHTTPRequestHandler.do_GET(self)
+        elif self.path == "/favicon.ico":
+            self.path = "/var/run/favicon.ico"
+            return SimpleHTTPRequestHandler.do_GET(self)
+        elif self.path == "/":
+            self.send_response(302)
+            self.send_header("Location", "/index.html")
+            self.end_headers()
+        else:
+            SimpleHTTPRequestHandler.send_error(self, code=403)
+
+    @staticmethod
+    def parse_offset(value):
+        """
+        Log offset from a query parameter or Last-Event-ID header, negative
+        values clamped to 0. None if it isn't an integer.
+        """
+        try:
+            return max(0, int(value))
+        except ValueError:
+            return None
+
+    def send_logs(self, url):
+        offset = 0
+        partial = False
+        query = parse_qs(url.query)
+        range_match = re.match(r"bytes=(\d+)-$", self.headers.get("Range", ""))
+        if "offset" in query:
+            offset = self.parse_offset(query["offset"][0])
+            if offset is None:
+                self.send_error(400, "Invalid log offset")
+                return
+        elif range_match:
+            offset = int(range_match.group(1))
+            partial = True
+
+        with open(self.log_path(), "rb") as log_file:
+            size = os.fstat(log_file.fileno()).st_size
+            log_file.seek(min(offset, size))
+            logs = log_file.read()
 
-    all_versions = set()
-    out = run_subprocess(
-        [
-            "git",
-            "ls-remote",
-            "--tags",
-            "--refs",
-            "https://github.com/jupyterhub/the-littlest-jupyterhub.git",
-        ]
+        # Reading from the end of the log is a normal poll, past it is an error
+        if (partial and not logs) or offset > size:
+            self.send_response(416)
+            self.send_header("Content-Range", "bytes */{}".format(size))
+            self.send_header("X-Log-Offset", str(size))
+            self.end_headers()
+            return
+        self.send_response(206 if partial else 200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(logs)))
+        self.send_header("X-Log-Offset", str(offset + len(logs)))
+        if partial:
+            self.send_header(
+                "Content-Range", "bytes {}-{}/*".format(offset, offset + len(logs) - 1)
+            )
+        self.end_headers()
+        self.wfile.write(logs)
+
+    def stream_logs(self):
+        offset = self.parse_offset(self.headers.get("Last-Event-ID") or 0)
+        if offset is None:
+            self.send_error(400, "Invalid Last-Event-ID")
+            return
+        # A client ahead of the log (say, after a reinstall) restarts from its end
+        offset = min(offset, os.path.getsize(self.log_path()))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        idle = 0
+        try:
+            while True:
+                with open(self.log_path(), "rb") as log_file:
+                    log_file.seek(offset)
+                    chunk = log_file.read(64 * 1024)
+                # Only whole lines are sent, a partial last line waits for the next poll
+                complete = chunk[: chunk.rfind(b"\n") + 1]
+                if not complete and len(chunk) == 64 * 1024:
+                    complete = chunk
+                if complete:
+                    offset += len(complete)
+                    events = [
+                        "data: {}\n".format(line)
+                        for line in complete.decode(errors="replace").splitlines()
+                    ]
+                    self.wfile.write(
+                        "{}id: {}\n\n".format("".join(events), offset).encode("utf-8")
+                    )
+                    self.wfile.flush()
+                    idle = 0
+                    continue
+
+                time.sleep(self.stream_poll_interval)
+                idle += self.stream_poll_interval
+                if idle >= self.stream_heartbeat_interval:
+                    # Comment line, to notice clients that went away
+                    self.wfile.write(b": heartbeat\n\n")
+                    self.wfile.flush()
+                    idle = 0
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+def _build_version_index(all_versions: set) -> dict:
+    """
+    Map every version prefix to the highest version starting with it, so that
+    "latest" (the empty prefix), "1" and "1.0" are single lookups.
+    """
+    index = {}
+    for v in all_versions:
+        for components in range(len(v) + 1):
+            prefix = v[:components]
+            if prefix not in index or index[prefix] < v:
+                index[prefix] = v
+    return index
+
+def _list_remote_tags_http(repo_url: str) -> str:
+    """
+    Tags of a remote repository in `git ls-remote --tags --refs` format, read
+    from the smart HTTP ref advertisement. Used when git isn't installed yet,
+    so the version can be resolved while apt is still installing it.
+    """
+    request = urllib.request.Request(
+        repo_url + "/info/refs?service=git-upload-pack",
+        headers={"User-Agent": "git/2.0 (tljh-bootstrap)"},
     )
+    with urllib.request.urlopen(request, timeout=60) as response:
+        data = response.read()
+
+    lines = []
+    offset = 0
+    while offset + 4 <= len(data):
+        length = int(data[offset : offset + 4], 16)
+        if length == 0:
+            offset += 4
+            continue
+        line = data[offset + 4 : offset + length].split(b"\0")[0].decode().strip()
+        offset += length
+        m = re.match(r"([a-f0-9]{40}) (refs/tags/\S+)$", line)
+        if m and not m.group(2).endswith("^{}"):
+            lines.append("{}\t{}".format(m.group(1), m.group(2)))
+    return "\n".join(lines)
 
+def _list_remote_tags(source: str) -> str:
+    if shutil.which("git"):
+        return run_subprocess(["git", "ls-remote", "--tags", "--refs", source], capture=True)
+    return _list_remote_tags_http(source)
+
+def _parse_tags(out: str) -> list:
+    tags = []
     for line in out.splitlines():
+        line = line.strip()
+        if not line:
+            continue
         m = re.match(r"(?P<sha>[a-f0-9]+)\s+refs/tags/(?P<tag>[\S]+)$", line)
-        if not m:
+        if m:
+            tags.append(m.group("tag"))
+        elif re.match(r"[\S]+$", line):
+            tags.append(line)
+        else:
             raise Exception("Unexpected git ls-remote output: {}".format(line))
-        tag = m.group("tag")
-        if tag == version:
-            return tag
-        if re.match(r"\d+\.\d+\.\d+$", tag):
-            all_versions.add(tuple(int(v) for v in tag.split(".")))
+    return tags
+
+def _tags_cache_path(cache_path: str = None) -> str:
+    """
+    Path of the tags cache: cache_path, TLJH_BOOTSTRAP_TAGS_CACHE or the
+    cache directory under TLJH_INSTALL_PREFIX.
+    """
+    if cache_path is not None:
+        return cache_path
+    install_prefix = os.environ.get("TLJH_INSTALL_PREFIX", "/opt/tljh")
+    return os.environ.get(
+        "TLJH_BOOTSTRAP_TAGS_CACHE", os.path.join(install_prefix, "cache", "tags.json")
+    )
+
+def _cached_tags(cache_path: str = None) -> list:
+    """
+    Tags available without a network query: those of a tags file source, or
+    those cached on disk for the current source, however old. None if neither
+    can be read.
+    """
+    source = os.environ.get("TLJH_BOOTSTRAP_TAGS_SOURCE", tljh_repo_url)
+    try:
+        if os.path.isfile(source):
+            with open(source) as f:
+                return _parse_tags(f.read())
+        with open(_tags_cache_path(cache_path)) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("source") != source:
+        return None
+    return cached["tags"]
 
+def _load_tags(cache_path: str = None) -> list:
+    """
+    List TLJH release tags from TLJH_BOOTSTRAP_TAGS_SOURCE. Tags fetched from a
+    git URL are cached on disk for TLJH_BOOTSTRAP_TAGS_TTL seconds under a file
+    lock, so concurrent bootstraps sharing the cache make a single query.
+    cache_path overrides TLJH_BOOTSTRAP_TAGS_CACHE.
+    """
+    source = os.environ.get("TLJH_BOOTSTRAP_TAGS_SOURCE", tljh_repo_url)
+    if os.path.isfile(source):
+        with open(source) as f:
+            return _parse_tags(f.read())
+
+    cache_path = _tags_cache_path(cache_path)
+    ttl = float(os.environ.get("TLJH_BOOTSTRAP_TAGS_TTL", "3600"))
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+
+    with open(cache_path + ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        cached = None
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+            if cached.get("source") != source:
+                cached = None
+        except (OSError, ValueError):
+            pass
+        if cached is not None and time.time() - cached["fetched_at"] < ttl:
+            logger.debug("Using cached TLJH tags from {}".format(cache_path))
+            return cached["tags"]
+
+        try:
+            tags = _parse_tags(_list_remote_tags(source))
+        except (subprocess.CalledProcessError, OSError) as e:
+            if cached is None:
+                raise
+            logger.warning(
+                "Could not list tags from {}, using cache from {}: {}".format(
+                    source, time.ctime(cached["fetched_at"]), e
+                )
+            )
+            return cached["tags"]
+
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"source": source, "fetched_at": time.time(), "tags": tags}, f)
+        os.replace(tmp_path, cache_path)
+        return tags
+
+def _tljh_install_url() -> str:
+    """
+    Git URL a resolved TLJH version is pip installed from: the repository the
+    tags were listed from, unless they came from a tags file.
+    """
+    source = os.environ.get("TLJH_BOOTSTRAP_TAGS_SOURCE", tljh_repo_url)
+    if os.path.isfile(source):
+        return tljh_repo_url
+    if os.path.isdir(source):
+        return "file://" + os.path.abspath(source)
+    return source
+
+def _resolve_git_version(version: str, tags_cache: str = None) -> str:
+    # An exact MAJOR.MINOR.PATCH release is checked against the tags already on
+    # disk, so fleet hosts install the version chosen by the controller without
+    # listing tags. Without a cache it is passed through for pip to check
+    if re.match(r"\d+\.\d+\.\d+$", version):
+        tags = _cached_tags(tags_cache)
+        if tags is None:
+            return version
+        if version not in tags:
+            # The cache may predate the release
+            tags = _load_tags(tags_cache)
+        if version not in tags:
+            raise Exception("No version {} found".format(version))
+        return version
+    # A branch or commit needs no tag lookup
+    if version != "latest" and not re.match(r"\d+(\.\d+)?$", version):
+        return version
+
+    tags = _load_tags(tags_cache)
+    if version in tags:
+        return version
+    all_versions = set(
+        tuple(int(v) for v in tag.split("."))
+        for tag in tags
+        if re.match(r"\d+\.\d+\.\d+$", tag)
+    )
     if not all_versions:
         raise Exception("No MAJOR.MINOR.PATCH git tags found")
 
     if version == "latest":
-        requested = "latest"
+        requested = ()
     else:
         requested = tuple(int(v) for v in version.split("."))
-    found = _find_matching_version(all_versions, requested)
+    found = _build_version_index(all_versions).get(requested)
     if not found:
         raise Exception(
             "No version matching {} found {}".format(version, sorted(all_versions))
         )
     return ".".join(str(f) for f in found)
 
+# Command prefixes running a command on a fleet target
+fleet_transports = {
+    "ssh": lambda target: ["ssh", "-o", "BatchMode=yes", target],
+    "docker": lambda target: ["docker", "exec", "-i", target],
+    "chroot": lambda target: ["chroot", target],
+    "local": lambda target: [],
+}
+
+# Environment variables passed on to fleet hosts. Paths such as
+# TLJH_INSTALL_PREFIX describe the controller, not the targets, so they stay behind
+fleet_forwarded_env = (
+    "TLJH_BOOTSTRAP_DEV",
+    "TLJH_BOOTSTRAP_PIP_SPEC",
+    "TLJH_BOOTSTRAP_TAGS_SOURCE",
+)
+
+# Tag cache of the controller, which usually can't write under /opt/tljh;
+# TLJH_BOOTSTRAP_TAGS_CACHE overrides it and isn't forwarded
+fleet_tags_cache = os.path.join("~", ".cache", "tljh-bootstrap", "tags.json")
+
+# Seconds to wait before retrying a failed host, multiplied by the attempt number
+fleet_retry_delay = 10
+
+fleet_step_timing = re.compile(r"(?P<step>.+) took (?P<seconds>[\d.]+)s$")
+
+def read_fleet_inventory(path: str) -> list:
+    hosts = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            if len(fields) < 3 or fields[1] not in fleet_transports:
+                raise Exception(
+                    "{}:{}: expected '<name> <{}> <target> [key=value ...]'".format(
+                        path, number, "|".join(sorted(fleet_transports))
+                    )
+                )
+            host = {"name": fields[0], "transport": fields[1], "target": fields[2]}
+            host.update(sudo="no", python="python3")
+            for option in fields[3:]:
+                key, _, value = option.partition("=")
+                if key not in ("sudo", "python"):
+                    raise Exception("{}:{}: unknown option {}".format(path, number, key))
+                host[key] = value
+            hosts.append(host)
+    return hosts
+
+def fleet_host_command(host: dict, flags: list) -> list:
+    """
+    Command piping this script into python on a fleet target, like
+    `curl <script-url> | sudo python3 -` on the host itself. The variables in
+    fleet_forwarded_env are passed along from the controller, except a tags
+    source that is a local path of the controller.
+    """
+    env = [
+        "{}={}".format(key, os.environ[key])
+        for key in fleet_forwarded_env
+        if key in os.environ
+        and not (key == "TLJH_BOOTSTRAP_TAGS_SOURCE" and os.path.exists(os.environ[key]))
+    ]
+    remote = ["env"] + env + [host["python"], "-"] + flags
+    if host["sudo"] == "yes":
+        remote = ["sudo"] + remote
+    prefix = fleet_transports[host["transport"]](host["target"])
+    if host["transport"] == "ssh":
+        return prefix + [" ".join(shlex.quote(arg) for arg in remote)]
+    return prefix + remote
+
+class FleetHost:
+    """
+    Progress of one fleet host: status, attempt, last output line and the step
+    timings the bootstrap reported.
+    """
+
+    def __init__(self, host: dict):
+        self.host = host
+        self.name = host["name"]
+        self.status = "pending"
+        self.attempt = 0
+        self.started = None
+        self.finished = None
+        self.last_line = ""
+        self.timings = []
+
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def describe(self) -> str:
+        return "{name:<20} {status:<9} attempt {attempt} {elapsed:7.1f}s  {line}".format(
+            name=self.name,
+            status=self.status,
+            attempt=self.attempt,
+            elapsed=self.elapsed(),
+            line=self.last_line[:80],
+        )
+
+def run_fleet_host(
+    state: FleetHost, command: list, script: bytes, log_dir: str, retries: int
+) -> bool:
+    state.started = time.monotonic()
+    log_path = os.path.join(log_dir, "{}.log".format(state.name))
+    for attempt in range(1, retries + 2):
+        state.status = "running"
+        state.attempt = attempt
+        state.timings = []
+        with open(log_path, "ab") as log_file:
+            log_file.write("=== attempt {} ===\n".format(attempt).encode())
+            try:
+                with subprocess.Popen(
+                    command,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                ) as proc:
+                    try:
+                        proc.stdin.write(script)
+                        proc.stdin.close()
+                    except BrokenPipeError:
+                        pass
+                    for raw_line in proc.stdout:
+                        log_file.write(raw_line)
+                        line = raw_line.decode(errors="replace").strip()
+                        if line:
+                            state.last_line = line
+                        m = fleet_step_timing.match(line)
+                        if m:
+                            state.timings.append((m.group("step"), float(m.group("seconds"))))
+                returncode = proc.returncode
+            except OSError as e:
+                log_file.write("{}\n".format(e).encode())
+                state.last_line = str(e)
+                returncode = None
+
+        if returncode == 0:
+            state.status = "done"
+            state.finished = time.monotonic()
+            return True
+        if attempt <= retries:
+            state.status = "retrying"
+            time.sleep(fleet_retry_delay * attempt)
+    state.status = "failed"
+    state.finished = time.monotonic()
+    return False
+
+def run_fleet(args, forwarded_flags: list) -> int:
+    """
+    Bootstrap every host of the inventory through a bounded worker pool,
+    logging aggregated progress until all hosts are done or failed.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+    script_path = os.path.abspath(sys.argv[0])
+    if not os.path.isfile(script_path):
+        logger.error("--fleet needs the bootstrap script saved to a file, not piped")
+        return 1
+    with open(script_path, "rb") as f:
+        script = f.read()
+
+    hosts = [FleetHost(host) for host in read_fleet_inventory(args.fleet)]
+    if not hosts:
+        logger.error("No hosts in {}".format(args.fleet))
+        return 1
+
+    # Resolved once here so that every host installs the same version
+    # without querying the tags upstream itself
+    flags = list(forwarded_flags)
+    if args.version or not os.environ.get("TLJH_BOOTSTRAP_PIP_SPEC"):
+        tags_cache = os.environ.get(
+            "TLJH_BOOTSTRAP_TAGS_CACHE", os.path.expanduser(fleet_tags_cache)
+        )
+        flags += ["--version", _resolve_git_version(args.version or "latest", tags_cache)]
+    if args.accelerated:
+        flags.append("--accelerated")
+    if args.show_progress_page:
+        flags.append("--show-progress-page")
+
+    os.makedirs(args.fleet_log_dir, exist_ok=True)
+    logger.info(
+        "Bootstrapping {} hosts, {} at a time, flags: {}".format(
+            len(hosts), args.fleet_parallel, " ".join(flags)
+        )
+    )
+    with ThreadPoolExecutor(max_workers=args.fleet_parallel) as executor:
+        pending = set(
+            executor.submit(
+                run_fleet_host,
+                state,
+                fleet_host_command(state.host, flags),
+                script,
+                args.fleet_log_dir,
+                args.fleet_retries,
+            )
+            for state in hosts
+        )
+        while pending:
+            done, pending = wait(pending, timeout=10, return_when=FIRST_COMPLETED)
+            counts = collections.Counter(state.status for state in hosts)
+            logger.info(
+                "Fleet progress: "
+                + ", ".join("{} {}".format(counts[s], s) for s in sorted(counts))
+            )
+            for state in hosts:
+                if state.status in ("running", "retrying"):
+                    logger.info("  " + state.describe())
+
+    logger.info("Fleet summary:")
+    for state in hosts:
+        logger.info("  " + state.describe())
+        if state.timings:
+            logger.info(
+                "    "
+                + ", ".join("{} {:.1f}s".format(step, seconds) for step, seconds in state.timings)
+            )
+    failed = [state.name for state in hosts if state.status != "done"]
+    if failed:
+        logger.error(
+            "Failed hosts: {} (logs in {})".format(", ".join(failed), args.fleet_log_dir)
+        )
+        return 1
+    return 0
+
 def main():
-    distro, version = ensure_host_system_can_install_tljh()
 
     parser = ArgumentParser(
         description=(
@@ -285,8 +885,41 @@ def main():
             "You can also pass a branch name such as 'main' or a commit hash."
         ),
     )
+    parser.add_argument(
+        "--accelerated",
+        action="store_true",
+        help=(
+            "Skip the second apt-get update when no apt source changed, resolve "
+            "the TLJH version concurrently with apt, and use a persistent pip "
+            "cache and wheelhouse under TLJH_INSTALL_PREFIX."
+        ),
+    )
+    parser.add_argument(
+        "--fleet",
+        metavar="INVENTORY",
+        help=(
+            "Controller mode: bootstrap every host listed in the inventory file "
+            "over ssh, docker exec or chroot instead of this machine."
+        ),
+    )
+    parser.add_argument(
+        "--fleet-parallel", type=int, default=4, help="Hosts bootstrapped at a time."
+    )
+    parser.add_argument(
+        "--fleet-retries", type=int, default=1, help="Retries of a failed host."
+    )
+    parser.add_argument(
+        "--fleet-log-dir",
+        default="tljh-fleet-logs",
+        help="Directory for the output of each fleet host.",
+    )
     args, tljh_installer_flags = parser.parse_known_args()
 
+    if args.fleet:
+        sys.exit(run_fleet(args, tljh_installer_flags))
+
+    distro, version = ensure_host_system_can_install_tljh()
+
     install_prefix = os.environ.get("TLJH_INSTALL_PREFIX", "/opt/tljh")
     hub_env_prefix = os.path.join(install_prefix, "hub")
     hub_env_python = os.path.join(hub_env_prefix, "bin", "python3")
@@ -294,6 +927,13 @@ def main():
     initial_setup = not os.path.exists(hub_env_python)
 
     if args.show_progress_page:
+        with open("/var/run/index.html", "w+") as f:
+            f.write(progress_page_html)
+        try:
+            urllib.request.urlretrieve(progress_page_favicon_url, "/var/run/favicon.ico")
+        except OSError:
+            pass
+
         try:
             def serve_forever(server):
                 try:
@@ -301,7 +941,7 @@ def main():
                 except KeyboardInterrupt:
                     pass
 
-            progress_page_server = HTTPServer(("", 80), ProgressPageRequestHandler)
+            progress_page_server = ThreadingHTTPServer(("", 80), ProgressPageRequestHandler)
             p = multiprocessing.Process(target=serve_forever, args=(progress_page_server,))
             p.start()
 
@@ -325,6 +965,35 @@ def main():
 
     logger.setLevel(logging.DEBUG)
 
+    timings = []
+    bootstrap_pip_spec = os.environ.get("TLJH_BOOTSTRAP_PIP_SPEC")
+    version_to_resolve = None
+    if args.version or not bootstrap_pip_spec:
+        version_to_resolve = args.version or "latest"
+
+    # The version lookup is network-bound and independent of apt, so in
+    # accelerated mode it runs in the background while the hub environment is set up
+    resolve_executor = None
+    resolved_version = None
+    if args.accelerated and version_to_resolve:
+        resolve_executor = ThreadPoolExecutor(max_workers=1)
+
+        def resolve_version_step():
+            with timed_step(timings, "Resolving TLJH version"):
+                return _resolve_git_version(version_to_resolve)
+
+        resolved_version = resolve_executor.submit(resolve_version_step)
+
+    if args.accelerated:
+        # Exported so the tljh installer's own pip runs reuse them too
+        os.environ.setdefault("PIP_CACHE_DIR", os.path.join(install_prefix, "cache", "pip"))
+        wheelhouse = os.environ.get(
+            "TLJH_BOOTSTRAP_WHEELHOUSE", os.path.join(install_prefix, "wheelhouse")
+        )
+        if os.path.isdir(wheelhouse) and os.listdir(wheelhouse):
+            logger.info("Using wheelhouse at {}".format(wheelhouse))
+            os.environ.setdefault("PIP_FIND_LINKS", wheelhouse)
+
     if not initial_setup:
         logger.info("Existing TLJH installation detected, upgrading...")
     else:
@@ -334,44 +1003,58 @@ def main():
 
         apt_get_adjusted_env = os.environ.copy()
         apt_get_adjusted_env["DEBIAN_FRONTEND"] = "noninteractive"
-        run_subprocess(["apt-get", "update"])
-        run_subprocess(
-            ["apt-get", "install", "--yes", "software-properties-common"],
-            env=apt_get_adjusted_env,
-        )
+        with timed_step(timings, "apt-get update"):
+            run_subprocess(["apt-get", "update"])
+        sources_checksum = apt_sources_checksum()
+        if args.accelerated and shutil.which("add-apt-repository"):
+            logger.info("software-properties-common already installed, skipping")
+        else:
+            with timed_step(timings, "Installing software-properties-common"):
+                run_subprocess(
+                    ["apt-get", "install", "--yes", "software-properties-common"],
+                    env=apt_get_adjusted_env,
+                )
         if distro == "ubuntu":
-            run_subprocess(["add-apt-repository", "universe", "--yes"])
-        run_subprocess(["apt-get", "update"])
-        run_subprocess(
-            [
-                "apt-get",
-                "install",
-                "--yes",
-                "python3",
-                "python3-venv",
-                "python3-pip",
-                "git",
-                "sudo",
-            ],
-            env=apt_get_adjusted_env,
-        )
+            with timed_step(timings, "Enabling universe repository"):
+                run_subprocess(["add-apt-repository", "universe", "--yes"])
+        if args.accelerated and apt_sources_checksum() == sources_checksum:
+            logger.info("No apt sources changed, skipping second apt-get update")
+        else:
+            with timed_step(timings, "apt-get update"):
+                run_subprocess(["apt-get", "update"])
+        with timed_step(timings, "Installing Python, venv, pip and git"):
+            run_subprocess(
+                [
+                    "apt-get",
+                    "install",
+                    "--yes",
+                    "python3",
+                    "python3-venv",
+                    "python3-pip",
+                    "git",
+                    "sudo",
+                ],
+                env=apt_get_adjusted_env,
+            )
 
         logger.info("Setting up virtual environment at {}".format(hub_env_prefix))
         os.makedirs(hub_env_prefix, exist_ok=True)
-        run_subprocess(["python3", "-m", "venv", hub_env_prefix])
+        with timed_step(timings, "Creating virtual environment"):
+            run_subprocess(["python3", "-m", "venv", hub_env_prefix])
 
     logger.info("Upgrading pip...")
-    run_subprocess([hub_env_pip, "install", "--upgrade", "pip"])
+    with timed_step(timings, "Upgrading pip"):
+        run_subprocess([hub_env_pip, "install", "--upgrade", "pip"])
 
     tljh_install_cmd = [hub_env_pip, "install", "--upgrade"]
-    bootstrap_pip_spec = os.environ.get("TLJH_BOOTSTRAP_PIP_SPEC")
-    if args.version or not bootstrap_pip_spec:
-        version_to_resolve = args.version or "latest"
-        bootstrap_pip_spec = (
-            "git+https://github.com/jupyterhub/the-littlest-jupyterhub.git@{}".format(
-                _resolve_git_version(version_to_resolve)
-            )
-        )
+    if version_to_resolve:
+        if resolved_version is not None:
+            version = resolved_version.result()
+            resolve_executor.shutdown()
+        else:
+            with timed_step(timings, "Resolving TLJH version"):
+                version = _resolve_git_version(version_to_resolve)
+        bootstrap_pip_spec = "git+{}@{}".format(_tljh_install_url(), version)
     elif os.environ.get("TLJH_BOOTSTRAP_DEV", "no") == "yes":
         logger.info("Selected TLJH_BOOTSTRAP_DEV=yes...")
         tljh_install_cmd.append("--editable")
@@ -381,8 +1064,13 @@ def main():
         logger.info("Installing TLJH installer...")
     else:
         logger.info("Upgrading TLJH installer...")
-    run_subprocess(tljh_install_cmd)
+    with timed_step(timings, "Installing TLJH installer"):
+        run_subprocess(tljh_install_cmd)
 
+    logger.info(
+        "Bootstrap steps: "
+        + ", ".join("{} {:.1f}s".format(name, elapsed) for name, elapsed in timings)
+    )
     logger.info("Running TLJH installer...")
     os.execv(
         hub_env_python, [hub_env_python, "-m", "tljh.installer"] + tljh_installer_flags
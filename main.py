@@ -1,13 +1,61 @@
+import argparse
+import asyncio
+import bisect
+import contextlib
+import csv
+import functools
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import socket
 import requests
 import psycopg2
-import schedule
+import psycopg2.extras
 import random
+import re
+import shutil
 import time
 import logging
+import math
+import sys
+import collections
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from requests.adapters import HTTPAdapter
+from urllib.parse import quote
+
+# pyarrow нужен только для выгрузки в Parquet
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Файлы конфигурации: TOML читается стандартной библиотекой (Python 3.11+), YAML - через PyYAML
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
 
 # Установка токена API HeadHunter
 hh_api_token = ''
 
+# Адрес API HeadHunter (для отладки и бенчмарков можно указать локальный сервер)
+hh_api_url = 'https://api.hh.ru'
+
 # Конфигурация базы данных
 db_config = {
     'dbname': 'default_db',
@@ -17,199 +65,3066 @@ db_config = {
     'port': '5432'
 }
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Города (название -> id региона hh.ru) и поисковые запросы
+cities = {
+    'Москва': 1,
+    'Санкт-Петербург': 2
+}
+
+vacancies = [
+    'BI Developer', 'Business Development Manager', 'Community Manager', 'Computer vision',
+    'Data Analyst', 'Data Engineer', 'Data Science', 'Data Scientist', 'ML Engineer',
+    'Machine Learning Engineer', 'ML OPS инженер', 'ML-разработчик', 'Machine Learning',
+    'Product Manager', 'Python Developer', 'Web Analyst', 'Аналитик данных',
+    'Бизнес-аналитик', 'Веб-аналитик', 'Системный аналитик', 'Финансовый аналитик'
+]
+
+# Параметры поиска. API отдает не больше max_results вакансий по одному запросу, поэтому
+# запрос с большим числом найденных делится на диапазоны дат публикации, пока каждый не
+# уместится в выдачу; название вакансии проверяет сам API (search_field)
+search_config = {
+    'per_page': 100,
+    'max_results': 2000,       # глубина выдачи, доступная через API
+    'period_days': 30,         # длина диапазона, отделяемого от открытого снизу (вся история)
+    'history_days': 365,       # глубже этого открытый снизу диапазон не делится
+    'min_partition': 3600,     # минимальная длина диапазона дат, секунд
+    'search_field': 'name',    # искать текст запроса только в названии вакансии
+    'title_filter': False      # дополнительно отбрасывать вакансии без точного вхождения запроса в название
+}
+
+# Режим обхода: инкрементальный (обновление по id вакансии) или полная перезагрузка таблицы
+crawl_config = {
+    'incremental': True,
+    'new_postings_overlap': 3600   # секунд, на которые обход только новых вакансий захватывает предыдущий запуск
+}
+
+# Параметры распределенного обхода: пары (город, запрос) разбираются из общей очереди
+# в PostgreSQL процессами-обработчиками на одной или нескольких машинах
+shard_config = {
+    'processes': 1,            # процессов-обработчиков на этой машине
+    'units_per_claim': 4,      # пар (город, запрос), забираемых из очереди за раз
+    'lease': 3600,             # секунд, после которых незавершенная пара снова доступна другим
+    'max_attempts': 3          # попыток обработки пары до признания ее неудачной
+}
+
+# Параметры параллельной загрузки
+fetch_config = {
+    'concurrency': 8,          # одновременных запросов к API
+    'request_budget': 20000,   # максимум запросов к API за один запуск
+    'timeout': 30              # таймаут одного запроса, секунд
+}
+
+# Параметры конвейера: загрузка страниц выдачи -> обогащение -> запись в базу данных
+pipeline_config = {
+    'search_workers': 2,       # параллельных загрузчиков страниц выдачи
+    'enrich_workers': 4,       # страниц, обогащаемых навыками и отраслями одновременно
+    'page_queue_size': 8,      # страниц выдачи в очереди на обогащение
+    'row_queue_size': 8,       # обогащенных страниц в очереди на запись
+    'stats_interval': 30.0     # секунд между отчетами о стадиях
+}
+
+# Параметры пакетной записи в базу данных
+writer_config = {
+    'method': 'copy',          # 'copy' (COPY FROM STDIN) или 'values' (execute_values)
+    'batch_size': 500,         # строк в одной транзакции
+    'flush_interval': 10.0     # максимум секунд между записями
+}
+
+# Параметры адаптивного ограничения частоты запросов (запросов в секунду) по классам эндпоинтов
+rate_limit_config = {
+    'endpoints': {
+        'search': {'rate': 2.0, 'min_rate': 0.2, 'max_rate': 10.0},      # /vacancies
+        'vacancy': {'rate': 4.0, 'min_rate': 0.5, 'max_rate': 20.0},     # /vacancies/{id}
+        'employer': {'rate': 4.0, 'min_rate': 0.5, 'max_rate': 20.0},    # /employers/{id}
+        'dictionary': {'rate': 1.0, 'min_rate': 0.2, 'max_rate': 2.0}    # /dictionaries
+    },
+    'increase_step': 0.05,     # прибавка к скорости после каждого успешного ответа
+    'decrease_factor': 0.5     # множитель скорости после ответа 429/5xx
+}
+
+# Параметры повторов запроса после ответа 429/5xx или ошибки соединения
+retry_config = {
+    'max_retries': 4,          # повторов одного запроса
+    'backoff_base': 1.0,       # задержка перед первым повтором, секунд; далее удваивается
+    'backoff_max': 60.0        # максимальная задержка перед повтором, секунд
+}
+
+# Параметры дискового кэша ответов API с условными запросами (ETag / If-Modified-Since)
+http_cache_config = {
+    'enabled': True,
+    'path': 'http_cache.sqlite3',
+    'max_bytes': 512 * 1024 * 1024,    # размер кэша, сверх которого вытесняются давно использованные ответы
+    'commit_batch': 200,               # ответов на одну транзакцию SQLite
+    'offline': False                   # воспроизведение только из кэша, без обращения к сети
+}
+
+# Параметры поиска, привязанные ко времени запуска: такие ответы не повторяются, их не кэшируем
+http_cache_skip_params = ('date_from', 'date_to')
+
+# Параметры кэша отраслей работодателей, сохраняемого между запусками
+employer_cache_config = {
+    'path': 'employer_cache.sqlite3',
+    'ttl': 7 * 24 * 3600,          # срок жизни найденной отрасли, секунд
+    'negative_ttl': 24 * 3600,     # срок жизни ответа 404 / 'Unknown', секунд
+    'max_size': 50000,             # максимум записей, лишние вытесняются по давности использования
+    'refresh_age': 24 * 3600,      # при плановом обновлении заново запрашиваются записи старше, секунд
+    'refresh_limit': 5000          # максимум запросов к API за одно плановое обновление
+}
+
+# Параметры постобработки строк перед записью: курсы валют берутся из справочника hh.ru
+# (/dictionaries) и хранятся в памяти ttl секунд; зарплата пересчитывается в рубли
+postprocess_config = {
+    'currency_ttl': 24 * 3600,
+    'base_currency': 'RUR'
+}
+
+# Синонимы навыков (ключ в нижнем регистре -> каноническое название); навыки, которых
+# нет в таблице, приводятся к виду первого встреченного написания без лишних пробелов
+skill_aliases = {
+    'python3': 'Python', 'python 3': 'Python', 'питон': 'Python',
+    'sql': 'SQL', 'ms sql': 'MS SQL Server', 'mssql': 'MS SQL Server', 'ms sql server': 'MS SQL Server',
+    'postgres': 'PostgreSQL', 'postgresql': 'PostgreSQL', 'postgre sql': 'PostgreSQL', 'psql': 'PostgreSQL',
+    'mysql': 'MySQL', 'clickhouse': 'ClickHouse', 'click house': 'ClickHouse',
+    'pandas': 'Pandas', 'numpy': 'NumPy', 'scikit-learn': 'scikit-learn', 'sklearn': 'scikit-learn',
+    'pytorch': 'PyTorch', 'torch': 'PyTorch', 'tensorflow': 'TensorFlow', 'tf': 'TensorFlow',
+    'ml': 'Machine Learning', 'машинное обучение': 'Machine Learning', 'machine learning': 'Machine Learning',
+    'power bi': 'Power BI', 'powerbi': 'Power BI', 'tableau': 'Tableau', 'excel': 'MS Excel', 'ms excel': 'MS Excel',
+    'apache spark': 'Spark', 'spark': 'Spark', 'pyspark': 'Spark', 'apache airflow': 'Airflow', 'airflow': 'Airflow',
+    'apache kafka': 'Kafka', 'kafka': 'Kafka', 'docker': 'Docker', 'k8s': 'Kubernetes', 'kubernetes': 'Kubernetes',
+    'git': 'Git', 'linux': 'Linux', 'английский язык': 'Английский язык', 'english': 'Английский язык'
+}
+
+# Уровни опыта hh.ru (experience.id) в порядке возрастания
+experience_levels = {
+    'noExperience': 0,         # нет опыта
+    'between1And3': 1,         # от 1 года до 3 лет
+    'between3And6': 2,         # от 3 до 6 лет
+    'moreThan6': 3             # более 6 лет
+}
+
+# Параметры выгрузки вакансий в файлы для аналитики (python main.py --export)
+export_config = {
+    'format': 'csv',           # 'csv', 'jsonl' или 'parquet' (требует pyarrow)
+    'path': 'export',          # каталог выгрузки; каждый снимок записывается в подкаталог snapshot=<id>
+    'compression': 'gzip',     # сжатие: 'gzip' или None для CSV/JSONL, кодек pyarrow для Parquet ('zstd', 'snappy', ...)
+    'batch_size': 5000         # строк, получаемых из курсора и записываемых в файл за раз
+}
+
+# Параметры аналитики: журнал изменений вакансий по запускам и агрегаты по дате публикации
+# (частота навыков, распределение зарплат, отрасли), пересчитываемые в конце запуска за затронутые дни
+analytics_config = {
+    'changes_retention_days': 90    # срок хранения журнала изменений, дней
+}
+
+# Задачи планировщика (python main.py daemon). every - период ('hour', 'day' или 'week'),
+# at - время запуска в периоде (':MM', 'HH:MM' или 'mon HH:MM', местное время), jitter - случайная
+# задержка запуска до jitter секунд, concurrency - одновременных запусков задачи в процессе.
+# Задачи с общим lock не выполняются одновременно и в разных процессах и на разных машинах
+# (advisory-блокировка PostgreSQL); запуск, совпавший с незавершенным, пропускается, а не откладывается.
+# Блокировку 'crawl' берут и обходы вне планировщика (run-once, --enqueue, --resume).
+# new_postings обходит только вакансии, опубликованные после предыдущего запуска, all_postings - всю
+# выдачу в режиме crawl_config['incremental']: по умолчанию таблица не перезагружается, а обновляется,
+# пропавшие из выдачи вакансии переносятся в архив
+scheduler_config = {
+    'jobs': {
+        'new_postings': {'every': 'hour', 'at': ':05', 'jitter': 300, 'concurrency': 1, 'lock': 'crawl'},
+        'all_postings': {'every': 'day', 'at': '12:00', 'jitter': 600, 'concurrency': 1, 'lock': 'crawl'},
+        'employer_cache': {'every': 'week', 'at': 'sun 03:00', 'jitter': 1800, 'concurrency': 1,
+                           'lock': 'employer_cache'}
+    }
+}
+
+# Параметры метрик: задержки, счетчики запросов, ошибок и обращений к кэшам;
+# при заданном порте метрики процесса отдаются в формате Prometheus по адресу /metrics
+metrics_config = {
+    'port': None,              # порт HTTP-эндпоинта /metrics (None - эндпоинт выключен)
+    'host': '0.0.0.0',
+    'buckets': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+}
+
+# Разделы файла конфигурации -> словари настроек модуля. Значения раздела дополняют словарь,
+# вложенные словари (rate_limit.endpoints) объединяются рекурсивно
+config_sections = {
+    'db': 'db_config', 'search': 'search_config', 'crawl': 'crawl_config', 'shard': 'shard_config',
+    'fetch': 'fetch_config', 'pipeline': 'pipeline_config', 'writer': 'writer_config',
+    'rate_limit': 'rate_limit_config', 'retry': 'retry_config', 'http_cache': 'http_cache_config',
+    'employer_cache': 'employer_cache_config', 'postprocess': 'postprocess_config',
+    'export': 'export_config', 'analytics': 'analytics_config', 'scheduler': 'scheduler_config',
+    'metrics': 'metrics_config'
+}
+
+# Настройки верхнего уровня файла конфигурации -> переменные модуля, заменяемые целиком
+config_values = {
+    'api_token': 'hh_api_token', 'api_url': 'hh_api_url', 'cities': 'cities', 'vacancies': 'vacancies',
+    'skill_aliases': 'skill_aliases', 'experience_levels': 'experience_levels'
+}
+
+# Переменные окружения поверх файла: HH_<НАСТРОЙКА> для настроек верхнего уровня (HH_API_TOKEN,
+# HH_CITIES='{"Москва": 1}') и HH_<РАЗДЕЛ>__<КЛЮЧ>[__<КЛЮЧ>] для разделов (HH_DB__PASSWORD,
+# HH_RATE_LIMIT__ENDPOINTS__SEARCH__RATE); путь к файлу конфигурации - HH_CONFIG
+config_env_prefix = 'HH_'
+
+# Функция для настройки логирования (при запуске из командной строки, не при импорте модуля)
+def setup_logging(level=logging.INFO):
+    logging.basicConfig(level=level, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Функция для чтения файла конфигурации по расширению: .toml, .yaml / .yml или .json
+def read_config_file(path):
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, 'rb') as f:
+        if extension == '.toml':
+            if tomllib is None:
+                raise RuntimeError("Для конфигурации в TOML нужен Python 3.11+")
+            return tomllib.load(f)
+        if extension in ('.yaml', '.yml'):
+            if yaml is None:
+                raise RuntimeError("Для конфигурации в YAML установите PyYAML: pip install pyyaml")
+            return yaml.safe_load(f) or {}
+        if extension == '.json':
+            return json.load(f)
+    raise ValueError(f"Неизвестный формат файла конфигурации: {path}")
 
-# Функция для создания таблицы vacancies
+# Функция для чтения настроек из переменных окружения в виде вложенного словаря, как в файле
+def read_config_env(environ):
+    config = {}
+    for name, raw in environ.items():
+        if not name.startswith(config_env_prefix) or name == 'HH_CONFIG':
+            continue
+        path = name[len(config_env_prefix):].lower().split('__')
+        if path[0] in config_values and len(path) == 1:
+            current = globals()[config_values[path[0]]]
+        elif path[0] in config_sections and len(path) > 1:
+            current = globals()[config_sections[path[0]]]
+            for key in path[1:]:
+                current = current.get(key) if isinstance(current, dict) else None
+        else:
+            continue
+
+        section = config
+        for key in path[:-1]:
+            section = section.setdefault(key, {})
+        section[path[-1]] = parse_env_value(raw, current)
+    return config
+
+# Функция для разбора значения переменной окружения по типу текущего значения настройки:
+# строки берутся как есть, остальное разбирается как JSON (числа, true/false, null, списки, словари)
+def parse_env_value(raw, current):
+    if isinstance(current, str):
+        return raw
+    if isinstance(current, bool):
+        return raw.strip().lower() in ('1', 'true', 'yes', 'on')
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+# Функция для объединения словаря настроек с загруженными значениями
+def merge_config(target, values, section):
+    for key, value in values.items():
+        if key not in target and section != 'db':
+            logging.warning(f"Неизвестная настройка {section}.{key}")
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_config(target[key], value, f"{section}.{key}")
+        else:
+            target[key] = value
+
+# Функция для применения настроек из файла или окружения к переменным модуля
+def apply_config(config, source):
+    for name, value in config.items():
+        if name in config_sections:
+            if not isinstance(value, dict):
+                raise ValueError(f"{source}: раздел '{name}' должен быть таблицей")
+            merge_config(globals()[config_sections[name]], value, name)
+        elif name in config_values:
+            globals()[config_values[name]] = value
+        else:
+            raise ValueError(f"{source}: неизвестный раздел или настройка '{name}'")
+
+# Функция для загрузки настроек при запуске: значения по умолчанию из модуля, поверх них файл
+# конфигурации (аргумент или HH_CONFIG), поверх него переменные окружения
+def load_config(path=None):
+    path = path or os.environ.get('HH_CONFIG')
+    if path:
+        apply_config(read_config_file(path), path)
+        logging.info(f"Загружена конфигурация {path}")
+    apply_config(read_config_env(os.environ), 'переменные окружения')
+    configure_runtime()
+
+# Функция для перенастройки объектов, созданных по значениям по умолчанию: пула соединений
+# HTTP-сессии и границ гистограмм метрик
+def configure_runtime():
+    mount_http_adapters()
+    metrics.buckets = tuple(metrics_config['buckets'])
+
+# Функция для снимка действующих настроек в формате файла конфигурации: передается процессам-
+# обработчикам, которые при запуске методом spawn или forkserver заново импортируют модуль
+def current_config():
+    config = {name: globals()[variable] for name, variable in config_sections.items()}
+    config.update({name: globals()[variable] for name, variable in config_values.items()})
+    return config
+
+# Общая HTTP-сессия с пулом соединений для всех запросов к API
+http_session = requests.Session()
+
+# Функция для подключения пулов соединений HTTP-сессии по числу одновременных запросов
+def mount_http_adapters():
+    for prefix in ('https://', 'http://'):
+        http_session.mount(prefix, HTTPAdapter(pool_connections=4, pool_maxsize=fetch_config['concurrency']))
+
+mount_http_adapters()
+
+# Метрики процесса: тип и описание для экспорта в формате Prometheus
+metric_definitions = {
+    'hh_api_requests_total': ('counter', 'Ответы API по классам эндпоинтов и кодам ответа'),
+    'hh_api_errors_total': ('counter', 'Ошибки запросов к API: соединение, 429, 5xx'),
+    'hh_api_retries_total': ('counter', 'Повторы запросов к API'),
+    'hh_api_request_seconds': ('histogram', 'Задержка одного HTTP-запроса к API, секунд'),
+    'hh_rate_limit_wait_seconds': ('histogram', 'Ожидание ограничителя частоты перед запросом, секунд'),
+    'hh_call_seconds': ('histogram', 'Длительность вызова функции загрузки с повторами, секунд'),
+    'hh_cache_requests_total': ('counter', 'Обращения к кэшам ответов API и работодателей'),
+    'hh_search_partitions_total': ('counter', 'Диапазоны дат, разбитые или усеченные из-за предела выдачи'),
+    'hh_failed_pages_total': ('counter', 'Страницы выдачи, обработанные с ошибкой'),
+    'hh_db_write_seconds': ('histogram', 'Длительность записи пакета строк в базу данных, секунд'),
+    'hh_rows_written_total': ('counter', 'Строки, переданные на запись в таблицу vacancies'),
+    'hh_analytics_seconds': ('histogram', 'Длительность обновления журнала изменений и агрегатов запуска, секунд'),
+    'hh_export_rows_total': ('counter', 'Строки, выгруженные в файлы'),
+    'hh_export_seconds': ('histogram', 'Длительность выгрузки снимка, секунд'),
+    'hh_runs_total': ('counter', 'Запуски парсинга по режимам и результатам'),
+    'hh_run_duration_seconds': ('histogram', 'Длительность запуска парсинга, секунд'),
+    'hh_last_run_timestamp_seconds': ('gauge', 'Время окончания последнего запуска парсинга (unix time)'),
+    'hh_job_runs_total': ('counter', 'Запуски задач планировщика по результату'),
+    'hh_job_duration_seconds': ('histogram', 'Длительность задач планировщика, секунд'),
+    'hh_employer_refresh_total': ('counter', 'Работодатели, отрасль которых заново запрошена плановым обновлением')
+}
+
+# Реестр метрик процесса: счетчики, значения (gauge) и гистограммы с метками
+class MetricsRegistry:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.values = {}        # (имя, метки) -> значение счетчика или gauge
+        self.histograms = {}    # (имя, метки) -> [числа наблюдений по корзинам, сумма, количество]
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[self.key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    # Замер длительности блока: with metrics.time('hh_db_write_seconds'): ...
+    @contextlib.contextmanager
+    def time(self, name, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started, **labels)
+
+    # Декоратор для замера длительности вызовов функции
+    def timed(self, name, **labels):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        with self.lock:
+            return (dict(self.values),
+                    {key: (list(buckets), total, count) for key, (buckets, total, count) in self.histograms.items()})
+
+    # Оценка квантиля по корзинам гистограммы (верхняя граница корзины)
+    def quantile(self, buckets, count, fraction):
+        rank = fraction * count
+        seen = 0
+        for bound, observed in zip(self.buckets, buckets):
+            seen += observed
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    # Изменение метрик с момента снимка since: приросты счетчиков, значения gauge
+    # и сводка по гистограммам; используется для итогов запуска
+    def summary(self, since=None):
+        values_before, histograms_before = since or ({}, {})
+        values, histograms = self.snapshot()
+        result = {}
+        for (name, labels), value in sorted(values.items()):
+            if metric_definitions[name][0] == 'counter':
+                value -= values_before.get((name, labels), 0)
+            if value:
+                result[self.series_name(name, labels)] = value
+        for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+            before_buckets, before_total, before_count = histograms_before.get(
+                (name, labels), ([0] * len(self.buckets), 0.0, 0)
+            )
+            buckets = [observed - before for observed, before in zip(buckets, before_buckets)]
+            count -= before_count
+            if count:
+                result[self.series_name(name, labels)] = {
+                    'count': count,
+                    'sum': round(total - before_total, 6),
+                    'p50': self.quantile(buckets, count, 0.5),
+                    'p99': self.quantile(buckets, count, 0.99)
+                }
+        return result
+
+    @staticmethod
+    def series_name(name, labels, extra=()):
+        labels = tuple(labels) + tuple(extra)
+        if not labels:
+            return name
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                   for _, value in labels)
+        return name + '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(labels, escaped)) + '}'
+
+    # Текстовый формат экспорта Prometheus (version 0.0.4)
+    def render(self):
+        values, histograms = self.snapshot()
+        lines = []
+        for name, (kind, description) in metric_definitions.items():
+            series = [(labels, value) for (metric, labels), value in values.items() if metric == name]
+            histogram_series = [(labels, data) for (metric, labels), data in histograms.items() if metric == name]
+            if not series and not histogram_series:
+                continue
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(series):
+                lines.append(f"{self.series_name(name, labels)} {value}")
+            for labels, (buckets, total, count) in sorted(histogram_series):
+                cumulative = 0
+                for bound, observed in zip(self.buckets, buckets):
+                    cumulative += observed
+                    lines.append(f"{self.series_name(name + '_bucket', labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.series_name(name + '_bucket', labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.series_name(name + '_sum', labels)} {total}")
+                lines.append(f"{self.series_name(name + '_count', labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry(metrics_config['buckets'])
+
+# Обработчик HTTP-эндпоинта /metrics
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+metrics_server = None
+
+# Функция для запуска эндпоинта /metrics в фоновом потоке. Отдаются метрики текущего
+# процесса; процессы-обработчики (--processes больше 1) сохраняют свои итоги в crawl_run_metrics
+def start_metrics_server(port=None, host=None):
+    global metrics_server
+    port = metrics_config['port'] if port is None else port
+    if port is None or metrics_server is not None:
+        return
+    metrics_server = ThreadingHTTPServer((host or metrics_config['host'], port), MetricsRequestHandler)
+    metrics_server.daemon_threads = True
+    threading.Thread(target=metrics_server.serve_forever, name='metrics', daemon=True).start()
+    logging.info(f"Метрики доступны по адресу http://{host or metrics_config['host']}:{port}/metrics")
+
+# Функция для создания таблиц: вакансии по id hh.ru, справочники работодателей, отраслей
+# и навыков, связь вакансий с навыками; таблица прежнего формата переносится в новую схему
 def create_table(conn):
     cursor = conn.cursor()
 
-    create_table_query = """
-        CREATE TABLE IF NOT EXISTS vacancies (
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'vacancies' AND column_name = 'company'
+    """)
+    legacy = cursor.fetchone() is not None
+    if legacy:
+        rename_legacy_table(cursor)
+
+    create_tables_query = """
+        CREATE TABLE IF NOT EXISTS industries (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(200) NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS employers (
+            id SERIAL PRIMARY KEY,
+            hh_id BIGINT UNIQUE,
+            name VARCHAR(200) NOT NULL,
+            industry_id INTEGER REFERENCES industries (id)
+        );
+        CREATE TABLE IF NOT EXISTS skills (
             id SERIAL PRIMARY KEY,
+            name VARCHAR(200) NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS vacancies (
+            hh_id BIGINT PRIMARY KEY,
             city VARCHAR(50),
-            company VARCHAR(200),
-            industry VARCHAR(200),
+            employer_id INTEGER REFERENCES employers (id),
             title VARCHAR(200),
             keywords TEXT,
-            skills TEXT,
             experience VARCHAR(50),
-            salary VARCHAR(50),
-            url VARCHAR(200)
+            experience_level SMALLINT,
+            salary_from NUMERIC,
+            salary_to NUMERIC,
+            salary_currency VARCHAR(3),
+            salary_gross BOOLEAN,
+            salary_from_rub NUMERIC,
+            salary_to_rub NUMERIC,
+            url VARCHAR(200) UNIQUE,
+            published_at TIMESTAMPTZ,
+            source_updated_at TIMESTAMPTZ,
+            first_seen_at TIMESTAMPTZ,
+            last_seen_at TIMESTAMPTZ,
+            archived BOOLEAN NOT NULL DEFAULT FALSE,
+            archived_at TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE TABLE IF NOT EXISTS vacancy_skills (
+            vacancy_id BIGINT NOT NULL REFERENCES vacancies (hh_id) ON DELETE CASCADE,
+            skill_id INTEGER NOT NULL REFERENCES skills (id),
+            PRIMARY KEY (vacancy_id, skill_id)
+        )
+    """
+    cursor.execute(create_tables_query)
+
+    # Связь вакансии со всеми парами (запрос, город), в выдаче которых она встречалась
+    create_matches_table_query = """
+        CREATE TABLE IF NOT EXISTS vacancy_matches (
+            hh_id BIGINT NOT NULL,
+            query VARCHAR(200) NOT NULL,
+            city_id INTEGER NOT NULL,
+            first_matched_at TIMESTAMPTZ NOT NULL,
+            last_matched_at TIMESTAMPTZ NOT NULL,
+            PRIMARY KEY (hh_id, query, city_id)
         )
     """
-    cursor.execute(create_table_query)
+    cursor.execute(create_matches_table_query)
+
+    # Индексы под выборки аналитики (город, дата, работодатель, зарплата, частота навыков)
+    # и под архивирование пропавших вакансий
+    create_indexes_query = """
+        CREATE UNIQUE INDEX IF NOT EXISTS employers_anonymous_name_key ON employers (name) WHERE hh_id IS NULL;
+        CREATE INDEX IF NOT EXISTS employers_industry_id ON employers (industry_id);
+        CREATE INDEX IF NOT EXISTS vacancies_employer_id ON vacancies (employer_id);
+        CREATE INDEX IF NOT EXISTS vacancies_city_published_at ON vacancies (city, published_at);
+        CREATE INDEX IF NOT EXISTS vacancies_published_at ON vacancies (published_at);
+        CREATE INDEX IF NOT EXISTS vacancies_salary ON vacancies (salary_currency, salary_from)
+            WHERE salary_from IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS vacancies_last_seen_at ON vacancies (last_seen_at) WHERE NOT archived;
+        CREATE INDEX IF NOT EXISTS vacancies_updated_at ON vacancies (updated_at);
+        CREATE INDEX IF NOT EXISTS vacancies_salary_rub ON vacancies (experience_level, salary_from_rub)
+            WHERE salary_from_rub IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS vacancy_skills_skill_id ON vacancy_skills (skill_id, vacancy_id);
+        CREATE UNIQUE INDEX IF NOT EXISTS skills_name_lower_key ON skills (lower(name))
+    """
+    cursor.execute(create_indexes_query)
+
+    if legacy:
+        migrate_legacy_table(cursor)
+
+    # Представление в прежнем плоском формате для существующих отчетов и выгрузок
+    create_view_query = """
+        CREATE VIEW vacancies_flat AS
+        SELECT
+            v.hh_id, v.city, e.name AS company, COALESCE(i.name, 'Unknown') AS industry, v.title, v.keywords,
+            (SELECT string_agg(s.name, ', ' ORDER BY s.name)
+             FROM vacancy_skills vs JOIN skills s ON s.id = vs.skill_id
+             WHERE vs.vacancy_id = v.hh_id) AS skills,
+            v.experience,
+            CASE WHEN v.salary_from IS NULL AND v.salary_to IS NULL THEN 'з/п не указана'
+                 ELSE v.salary_from::TEXT END AS salary,
+            v.url, v.published_at, v.source_updated_at, v.first_seen_at, v.last_seen_at, v.archived, v.archived_at
+        FROM vacancies v
+        LEFT JOIN employers e ON e.id = v.employer_id
+        LEFT JOIN industries i ON i.id = e.industry_id
+    """
+    cursor.execute("SELECT to_regclass('vacancies_flat')")
+    if cursor.fetchone()[0] is None:
+        cursor.execute(create_view_query)
 
     conn.commit()
     cursor.close()
     logging.info("Таблица 'vacancies' успешно создана.")
 
-# Функция для удаления таблицы vacancies
+# Функция для переименования таблицы vacancies прежнего формата (одна широкая таблица
+# со строковыми навыками и зарплатой) в vacancies_legacy вместе с ее индексами
+def rename_legacy_table(cursor):
+    cursor.execute("DROP VIEW IF EXISTS vacancies_flat")
+    cursor.execute("ALTER TABLE vacancies RENAME TO vacancies_legacy")
+    cursor.execute("ALTER INDEX IF EXISTS vacancies_pkey RENAME TO vacancies_legacy_pkey")
+    cursor.execute("ALTER INDEX IF EXISTS vacancies_hh_id_key RENAME TO vacancies_legacy_hh_id_key")
+
+    # Столбцы инкрементального режима для таблицы, созданной первыми версиями парсера
+    migrate_table_query = """
+        ALTER TABLE vacancies_legacy
+            ADD COLUMN IF NOT EXISTS hh_id BIGINT,
+            ADD COLUMN IF NOT EXISTS published_at TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS source_updated_at TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS first_seen_at TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS archived BOOLEAN NOT NULL DEFAULT FALSE,
+            ADD COLUMN IF NOT EXISTS archived_at TIMESTAMPTZ
+    """
+    cursor.execute(migrate_table_query)
+
+    # Идентификатор hh.ru для старых строк берется из url (по одной строке на url)
+    backfill_hh_id_query = """
+        UPDATE vacancies_legacy v
+        SET hh_id = substring(v.url from '/vacancy/([0-9]+)')::BIGINT
+        WHERE v.hh_id IS NULL
+          AND v.url ~ '/vacancy/[0-9]+'
+          AND v.id IN (SELECT MIN(id) FROM vacancies_legacy WHERE hh_id IS NULL GROUP BY url)
+          AND NOT EXISTS (
+              SELECT 1 FROM vacancies_legacy k
+              WHERE k.hh_id = substring(v.url from '/vacancy/([0-9]+)')::BIGINT
+          )
+    """
+    cursor.execute(backfill_hh_id_query)
+
+# Функция для переноса строк vacancies_legacy в новую схему. Идентификаторы работодателей
+# в старой таблице не хранились, поэтому работодатели переносятся по названию (hh_id пустой)
+# до следующего обновления вакансии; строки без id hh.ru (дубликаты по url) не переносятся
+def migrate_legacy_table(cursor):
+    cursor.execute("""
+        INSERT INTO industries (name)
+        SELECT DISTINCT industry FROM vacancies_legacy
+        WHERE industry IS NOT NULL AND industry <> 'Unknown'
+        ON CONFLICT (name) DO NOTHING
+    """)
+    cursor.execute("""
+        INSERT INTO employers (name, industry_id)
+        SELECT DISTINCT ON (l.company) l.company, i.id
+        FROM vacancies_legacy l
+        LEFT JOIN industries i ON i.name = l.industry
+        WHERE l.company IS NOT NULL AND l.hh_id IS NOT NULL
+        ORDER BY l.company, i.id NULLS LAST
+        ON CONFLICT (name) WHERE hh_id IS NULL DO NOTHING
+    """)
+    cursor.execute("""
+        INSERT INTO vacancies (
+            hh_id, city, employer_id, title, keywords, experience, salary_from, url,
+            published_at, source_updated_at, first_seen_at, last_seen_at, archived, archived_at
+        )
+        SELECT
+            l.hh_id, l.city, e.id, l.title, regexp_replace(l.keywords, '</?highlighttext>', '', 'g'), l.experience,
+            CASE WHEN l.salary ~ '^[0-9]+(\\.[0-9]+)?$' THEN l.salary::NUMERIC END,
+            l.url, l.published_at, l.source_updated_at, l.first_seen_at, l.last_seen_at, l.archived, l.archived_at
+        FROM vacancies_legacy l
+        LEFT JOIN employers e ON e.hh_id IS NULL AND e.name = l.company
+        WHERE l.hh_id IS NOT NULL
+        ON CONFLICT (hh_id) DO NOTHING
+    """)
+    migrated = cursor.rowcount
+    cursor.execute("""
+        INSERT INTO skills (name)
+        SELECT DISTINCT trim(skill)
+        FROM vacancies_legacy, unnest(string_to_array(skills, ',')) AS skill
+        WHERE hh_id IS NOT NULL AND trim(skill) <> ''
+        ON CONFLICT DO NOTHING
+    """)
+    cursor.execute("""
+        INSERT INTO vacancy_skills (vacancy_id, skill_id)
+        SELECT DISTINCT l.hh_id, s.id
+        FROM vacancies_legacy l, unnest(string_to_array(l.skills, ',')) AS skill
+        JOIN skills s ON lower(s.name) = lower(trim(skill))
+        WHERE l.hh_id IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """)
+    logging.info(f"Таблица 'vacancies' прежнего формата переименована в 'vacancies_legacy', "
+                 f"перенесено вакансий: {migrated}.")
+
+# Функция для удаления таблицы vacancies (справочники работодателей, отраслей и навыков сохраняются)
 def drop_table(conn):
     cursor = conn.cursor()
 
-    drop_table_query = "DROP TABLE IF EXISTS vacancies"
+    drop_table_query = "DROP TABLE IF EXISTS vacancy_skills, vacancies, vacancy_matches CASCADE"
     cursor.execute(drop_table_query)
 
     conn.commit()
     cursor.close()
     logging.info("Таблица 'vacancies' успешно удалена.")
 
-# Функция для получения вакансий
-def get_vacancies(city, vacancy, page):
-    url = 'https://api.hh.ru/vacancies'
+# Ограничитель частоты запросов (token bucket) с адаптивной скоростью:
+# скорость растет, пока ответы успешные, и снижается после 429/5xx
+class RateLimiter:
+    def __init__(self, name, rate, min_rate, max_rate):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = 1.0
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.calls = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    # Резервирует токен и ждет его появления; возвращает время ожидания в секундах
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            capacity = max(1.0, self.rate)
+            self.tokens = min(capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1.0
+            wait = max(-self.tokens / self.rate, self.blocked_until - now, 0.0)
+            self.calls += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + rate_limit_config['increase_step'])
+
+    def on_throttle(self, retry_after=None):
+        with self.lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * rate_limit_config['decrease_factor'])
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def log_stats(self):
+        average_wait = self.total_wait / self.calls if self.calls else 0.0
+        logging.info(
+            f"Лимитер '{self.name}': скорость {self.rate:.2f} зап/с, запросов {self.calls}, "
+            f"ответов 429/5xx {self.throttled}, ожидание {self.total_wait:.1f} с "
+            f"(в среднем {average_wait:.2f} с, максимум {self.max_wait:.2f} с)"
+        )
+
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+
+# Функция для получения общего ограничителя класса эндпоинтов
+def get_rate_limiter(endpoint):
+    with rate_limiters_lock:
+        if endpoint not in rate_limiters:
+            rate_limiters[endpoint] = RateLimiter(endpoint, **rate_limit_config['endpoints'][endpoint])
+        return rate_limiters[endpoint]
+
+# Функция для разбора заголовка Retry-After (секунды или HTTP-дата)
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class OfflineCacheMiss(requests.RequestException):
+    pass
+
+CacheEntry = collections.namedtuple('CacheEntry', ['status', 'body', 'etag', 'last_modified'])
+
+# Дисковый кэш ответов API в SQLite: тело ответа хранится вместе с ETag и Last-Modified,
+# повторный запрос отправляется условным, и ответ 304 обслуживается из кэша
+class HttpCache:
+    def __init__(self, path, max_bytes, commit_batch):
+        self.max_bytes = max_bytes
+        self.commit_batch = commit_batch
+        self.lock = threading.Lock()
+        self.accessed = {}
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(url, params=None):
+        query = '&'.join(f"{name}={value}" for name, value in sorted((params or {}).items()))
+        return f"{url}?{query}" if query else url
+
+    def lookup(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT status, body, etag, last_modified FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        return CacheEntry(*row) if row is not None else None
+
+    # Учет обращения: hit - ответ получен из кэша (304 или режим без сети)
+    def record(self, key, hit):
+        metrics.inc('hh_cache_requests_total', cache='http', result='hit' if hit else 'miss')
+        with self.lock:
+            if hit:
+                self.hits += 1
+                self.accessed[key] = time.time()
+            else:
+                self.misses += 1
+
+    def store(self, key, response):
+        body = response.content
+        now = time.time()
+        with self.lock:
+            previous = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, response.status_code, body, response.headers.get('ETag'),
+                 response.headers.get('Last-Modified'), len(body), now, now)
+            )
+            self.size += len(body) - (previous[0] if previous else 0)
+            if self.size > self.max_bytes:
+                self.evict()
+            # Фиксация пачками: commit на каждый ответ сериализует потоки загрузки на fsync
+            self.pending += 1
+            if self.pending >= self.commit_batch:
+                self.conn.commit()
+                self.pending = 0
+
+    # Вытеснение давно использованных ответов до 90% допустимого размера
+    def evict(self):
+        self.flush_accessed()
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self.size <= target:
+                break
+            evicted.append((key,))
+            self.size -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.evicted += len(evicted)
+
+    def flush_accessed(self):
+        self.conn.executemany(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self.accessed.items()]
+        )
+        self.accessed = {}
+
+    def close(self):
+        with self.lock:
+            self.flush_accessed()
+            self.conn.commit()
+            self.conn.close()
+
+        logging.info(f"Кэш ответов API: из кэша {self.hits}, загружено {self.misses}, "
+                     f"вытеснено {self.evicted}, размер {self.size / 1024 / 1024:.1f} МБ")
+
+http_cache = None
+http_cache_users = 0
+http_cache_lock = threading.Lock()
+
+# Функция для получения общего кэша ответов API; None, если кэш выключен. Обращаться к нему
+# можно только между open_http_cache и close_http_cache, иначе чужой close закроет его на ходу
+def get_http_cache():
+    global http_cache
+    with http_cache_lock:
+        if http_cache_users == 0:
+            raise RuntimeError("Кэш ответов API используется без open_http_cache()")
+        if not http_cache_config['enabled'] and not http_cache_config['offline']:
+            return None
+        if http_cache is None:
+            http_cache = HttpCache(http_cache_config['path'], http_cache_config['max_bytes'],
+                                   http_cache_config['commit_batch'])
+        return http_cache
+
+# Функция для начала работы с кэшем ответов API. Задачи планировщика выполняются в потоках одного
+# процесса, поэтому кэш закрывается, только когда его освободят все открывшие
+def open_http_cache():
+    global http_cache_users
+    with http_cache_lock:
+        http_cache_users += 1
+    return get_http_cache()
+
+# Функция для освобождения кэша ответов API в конце запуска
+def close_http_cache():
+    global http_cache, http_cache_users
+    with http_cache_lock:
+        http_cache_users = max(http_cache_users - 1, 0)
+        if http_cache is not None and http_cache_users == 0:
+            http_cache.close()
+            http_cache = None
+
+# Функция для построения ответа из записи кэша
+def cached_response(url, entry):
+    response = requests.Response()
+    response.url = url
+    response.status_code = entry.status
+    response._content = entry.body
+    response.encoding = 'utf-8'
+    response.headers['X-Cache'] = 'HIT'
+    return response
+
+# Функция для расчета задержки перед повтором: экспоненциальный рост с ограничением и случайным разбросом
+def backoff_delay(attempt):
+    delay = min(retry_config['backoff_max'], retry_config['backoff_base'] * 2 ** attempt)
+    return delay * random.uniform(0.5, 1.0)
+
+# Функция для выполнения GET-запроса к API через кэш ответов и ограничитель частоты
+# с повторами после 429/5xx и ошибок соединения
+def api_get(endpoint, url, params=None, headers=None):
+    cache = get_http_cache()
+    if cache is not None and any(name in (params or {}) for name in http_cache_skip_params):
+        cache = None
+    key = HttpCache.key(url, params)
+    entry = cache.lookup(key) if cache is not None else None
+
+    if http_cache_config['offline']:
+        if entry is None:
+            raise OfflineCacheMiss(f"Нет сохраненного ответа для {key}")
+        cache.record(key, hit=True)
+        return cached_response(url, entry)
+
+    headers = dict(headers or {})
+    if entry is not None and entry.etag:
+        headers['If-None-Match'] = entry.etag
+    if entry is not None and entry.last_modified:
+        headers['If-Modified-Since'] = entry.last_modified
+
+    limiter = get_rate_limiter(endpoint)
+    max_retries = retry_config['max_retries']
+
+    for attempt in range(max_retries + 1):
+        metrics.observe('hh_rate_limit_wait_seconds', limiter.acquire(), endpoint=endpoint)
+        try:
+            with metrics.time('hh_api_request_seconds', endpoint=endpoint):
+                response = http_session.get(url, params=params, headers=headers, timeout=fetch_config['timeout'])
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.inc('hh_api_errors_total', endpoint=endpoint, reason='connection')
+            if attempt >= max_retries:
+                raise
+            metrics.inc('hh_api_retries_total', endpoint=endpoint)
+            delay = backoff_delay(attempt)
+            logging.warning(f"Ошибка соединения с {url}: {e}, повтор {attempt + 1} из {max_retries} через {delay:.1f} с")
+            time.sleep(delay)
+            continue
+
+        metrics.inc('hh_api_requests_total', endpoint=endpoint, status=response.status_code)
+        if response.status_code == 429 or response.status_code >= 500:
+            metrics.inc('hh_api_errors_total', endpoint=endpoint,
+                        reason='throttled' if response.status_code == 429 else 'server')
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            limiter.on_throttle(retry_after)
+            if attempt < max_retries:
+                metrics.inc('hh_api_retries_total', endpoint=endpoint)
+                # При Retry-After ожидание обеспечивает ограничитель, иначе - экспоненциальная задержка
+                delay = 0.0 if retry_after is not None else backoff_delay(attempt)
+                logging.warning(f"Ответ {response.status_code} от {url}, повтор {attempt + 1} из {max_retries} "
+                                f"через {retry_after if retry_after is not None else delay:.1f} с")
+                time.sleep(delay)
+                continue
+        else:
+            limiter.on_success()
+
+        if cache is not None and response.status_code == 304 and entry is not None:
+            cache.record(key, hit=True)
+            return cached_response(url, entry)
+        if cache is not None and response.status_code in (200, 404):
+            cache.record(key, hit=False)
+            cache.store(key, response)
+        return response
+
+# Функция для получения вакансий (необязательно - опубликованных в диапазоне дат)
+@metrics.timed('hh_call_seconds', function='get_vacancies')
+def get_vacancies(city, vacancy, page, date_from=None, date_to=None):
+    url = f'{hh_api_url}/vacancies'
     params = {
-        'text': f"{vacancy} {city}",
+        'text': vacancy,
+        'search_field': search_config['search_field'],
         'area': city,
         'specialization': 1,
-        'per_page': 100,
+        'per_page': search_config['per_page'],
         'page': page
     }
+    if date_from is not None:
+        params['date_from'] = date_from.strftime('%Y-%m-%dT%H:%M:%S%z')
+    if date_to is not None:
+        params['date_to'] = date_to.strftime('%Y-%m-%dT%H:%M:%S%z')
     headers = {
         'Authorization': f'Bearer {hh_api_token}'
     }
 
-    response = requests.get(url, params=params, headers=headers)
+    response = api_get('search', url, params=params, headers=headers)
     response.raise_for_status()
     return response.json()
 
-# Функция для получения навыков вакансии
+# Функция для получения списка навыков вакансии
+@metrics.timed('hh_call_seconds', function='get_vacancy_skills')
 def get_vacancy_skills(vacancy_id):
-    url = f'https://api.hh.ru/vacancies/{vacancy_id}'
+    url = f'{hh_api_url}/vacancies/{vacancy_id}'
     headers = {
         'Authorization': f'Bearer {hh_api_token}'
     }
 
-    response = requests.get(url, headers=headers)
+    response = api_get('vacancy', url, headers=headers)
     response.raise_for_status()
     data = response.json()
 
-    skills = [skill['name'] for skill in data.get('key_skills', [])]
-    return ', '.join(skills)
+    return [skill['name'].strip() for skill in data.get('key_skills', []) if skill['name'].strip()]
 
-# Функция для получения отрасли компании
-def get_industry(company_id):
-    # Получение отрасли компании по ее идентификатору
-    if company_id is None:
-        return 'Unknown'
+# Кэш отраслей работодателей в локальном файле SQLite с TTL и вытеснением по LRU
+class EmployerCache:
+    def __init__(self, path, ttl, negative_ttl, max_size):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.accessed = {}
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS employer_industries (
+                employer_id TEXT PRIMARY KEY,
+                industry TEXT,
+                found INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS employer_industries_accessed_at ON employer_industries (accessed_at)"
+        )
+        self.conn.commit()
+
+    # Возвращает (True, отрасль) для действующей записи и (False, None) при промахе
+    def lookup(self, employer_id):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT industry, found, fetched_at FROM employer_industries WHERE employer_id = ?",
+                (str(employer_id),)
+            ).fetchone()
+            if row is not None:
+                industry, found, fetched_at = row
+                if now - fetched_at < (self.ttl if found else self.negative_ttl):
+                    self.hits += 1
+                    self.accessed[str(employer_id)] = now
+                    metrics.inc('hh_cache_requests_total', cache='employer', result='hit')
+                    return True, industry
+            self.misses += 1
+            metrics.inc('hh_cache_requests_total', cache='employer', result='miss')
+            return False, None
+
+    # id работодателей, записи которых получены раньше age секунд назад, начиная с используемых последними
+    def stale(self, age, limit):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT employer_id FROM employer_industries WHERE fetched_at < ? ORDER BY accessed_at DESC LIMIT ?",
+                (time.time() - age, limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def store(self, employer_id, industry, found):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO employer_industries VALUES (?, ?, ?, ?, ?)",
+                (str(employer_id), industry, int(found), now, now)
+            )
+            self.conn.commit()
+
+    # Сохраняет время обращений, удаляет просроченные записи и вытесняет лишние
+    def close(self):
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE employer_industries SET accessed_at = ? WHERE employer_id = ?",
+                [(accessed_at, employer_id) for employer_id, accessed_at in self.accessed.items()]
+            )
+            self.conn.execute(
+                "DELETE FROM employer_industries WHERE fetched_at < ? - CASE WHEN found THEN ? ELSE ? END",
+                (now, self.ttl, self.negative_ttl)
+            )
+            self.conn.execute("""
+                DELETE FROM employer_industries WHERE employer_id IN (
+                    SELECT employer_id FROM employer_industries
+                    ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_size,))
+            self.conn.commit()
+            size = self.conn.execute("SELECT COUNT(*) FROM employer_industries").fetchone()[0]
+            self.conn.close()
 
-    url = f'https://api.hh.ru/employers/{company_id}'
-    response = requests.get(url)
+        logging.info(f"Кэш работодателей: попаданий {self.hits}, промахов {self.misses}, записей {size}")
+
+employer_cache = None
+employer_cache_users = 0
+employer_cache_lock = threading.Lock()
+
+# Функция для получения общего кэша работодателей (открывается при первом обращении),
+# как и кэш ответов API - только между open_employer_cache и close_employer_cache
+def get_employer_cache():
+    global employer_cache
+    with employer_cache_lock:
+        if employer_cache_users == 0:
+            raise RuntimeError("Кэш работодателей используется без open_employer_cache()")
+        if employer_cache is None:
+            employer_cache = EmployerCache(employer_cache_config['path'], employer_cache_config['ttl'],
+                                           employer_cache_config['negative_ttl'], employer_cache_config['max_size'])
+        return employer_cache
+
+# Функция для начала работы с кэшем работодателей; закрывается он, как и кэш ответов API,
+# когда его освободят все открывшие
+def open_employer_cache():
+    global employer_cache_users
+    with employer_cache_lock:
+        employer_cache_users += 1
+    return get_employer_cache()
+
+# Функция для освобождения кэша работодателей в конце запуска
+def close_employer_cache():
+    global employer_cache, employer_cache_users
+    with employer_cache_lock:
+        employer_cache_users = max(employer_cache_users - 1, 0)
+        if employer_cache is not None and employer_cache_users == 0:
+            employer_cache.close()
+            employer_cache = None
+
+# Функция для загрузки отрасли компании из API с сохранением в кэш
+@metrics.timed('hh_call_seconds', function='load_industry')
+def load_industry(company_id):
+    url = f'{hh_api_url}/employers/{company_id}'
+    response = api_get('employer', url)
     if response.status_code == 404:
+        get_employer_cache().store(company_id, 'Unknown', False)
         return 'Unknown'
     response.raise_for_status()
     data = response.json()
 
     if 'industries' in data and len(data['industries']) > 0:
-        return data['industries'][0].get('name')
+        industry = data['industries'][0].get('name')
+        get_employer_cache().store(company_id, industry, True)
+        return industry
+    get_employer_cache().store(company_id, 'Unknown', False)
     return 'Unknown'
 
-# Функция для парсинга вакансий
-def parse_vacancies():
-    cities = {
-        'Москва': 1,
-        'Санкт-Петербург': 2
-    }
+# Функция для получения отрасли компании
+@metrics.timed('hh_call_seconds', function='get_industry')
+def get_industry(company_id):
+    # Получение отрасли компании по ее идентификатору
+    if company_id is None:
+        return 'Unknown'
+
+    cached, industry = get_employer_cache().lookup(company_id)
+    if cached:
+        return industry
+    return load_industry(company_id)
 
-    vacancies = [
-        'BI Developer', 'Business Development Manager', 'Community Manager', 'Computer vision',
-        'Data Analyst', 'Data Engineer', 'Data Science', 'Data Scientist', 'ML Engineer',
-        'Machine Learning Engineer', 'ML OPS инженер', 'ML-разработчик', 'Machine Learning',
-        'Product Manager', 'Python Developer', 'Web Analyst', 'Аналитик данных',
-        'Бизнес-аналитик', 'Веб-аналитик', 'Системный аналитик', 'Финансовый аналитик'
+class RequestBudgetExceeded(Exception):
+    pass
+
+# Движок параллельной загрузки: блокирующие запросы к API выполняются в пуле потоков,
+# число одновременных запросов ограничено семафором, общее число - бюджетом запуска
+class FetchEngine:
+    def __init__(self, concurrency, request_budget):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.request_budget = request_budget
+        self.requests_made = 0
+        self.budget_exhausted = False
+        self.shared_calls = {}
+
+    async def call(self, func, *args):
+        if self.requests_made >= self.request_budget:
+            if not self.budget_exhausted:
+                self.budget_exhausted = True
+                logging.warning(f"Исчерпан бюджет запросов: {self.request_budget}, обход будет неполным")
+            raise RequestBudgetExceeded(f"Исчерпан бюджет запросов: {self.request_budget}")
+        self.requests_made += 1
+
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+
+    # Одинаковые вызовы с общим ключом выполняются за запуск один раз, остальные ждут их результата
+    async def call_once(self, key, func, *args):
+        if key not in self.shared_calls:
+            task = asyncio.ensure_future(self.call(func, *args))
+            task.add_done_callback(lambda done: (done.cancelled() or done.exception()) and self.shared_calls.pop(key, None))
+            self.shared_calls[key] = task
+        return await asyncio.shield(self.shared_calls[key])
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+# Функция для разбора даты из ответа API (формат 2024-01-31T12:00:00+0300)
+def parse_api_datetime(value):
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z')
+
+# Отметка изменения вакансии в поисковой выдаче: updated_at, если есть, иначе published_at
+def item_updated_at(item):
+    return parse_api_datetime(item.get('updated_at') or item.get('published_at'))
+
+# Строка для записи: вакансия с работодателем, отраслью и списком навыков; зарплата
+# разбирается на нижнюю и верхнюю границы, валюту и признак суммы до вычета налогов.
+# Последние поля заполняет постобработка пакета строк (postprocess_rows)
+VacancyRow = collections.namedtuple('VacancyRow', [
+    'hh_id', 'city', 'employer_hh_id', 'company', 'industry', 'title', 'keywords', 'skills', 'experience',
+    'experience_id', 'salary_from', 'salary_to', 'salary_currency', 'salary_gross', 'url', 'published_at',
+    'source_updated_at', 'experience_level', 'salary_from_rub', 'salary_to_rub'
+], defaults=(None, None, None))
+
+# Функция для формирования строки таблицы vacancies из элемента поисковой выдачи
+def build_row(city, item, skills, industry):
+    title = f"{item['name']} ({city})"
+    keywords = item['snippet'].get('requirement', '')
+    employer = item['employer']
+    experience = item['experience'].get('name', '')
+    salary = item['salary'] or {}
+    url = item['alternate_url']
+    published_at = parse_api_datetime(item.get('published_at'))
+
+    return VacancyRow(
+        int(item['id']), city, int(employer['id']) if employer.get('id') else None, employer['name'],
+        industry if industry != 'Unknown' else None, title, keywords, skills, experience,
+        item['experience'].get('id'), salary.get('from'), salary.get('to'), salary.get('currency'), salary.get('gross'),
+        url, published_at, item_updated_at(item)
+    )
+
+highlight_pattern = re.compile(r'</?highlighttext>')
+whitespace_pattern = re.compile(r'\s+')
+
+# Функция для удаления тегов подсветки из столбца текстов за один проход регулярного
+# выражения по склеенной строке (разделитель \x00 в текстах из API не встречается)
+def strip_highlight(texts):
+    stripped = highlight_pattern.sub('', '\x00'.join(text or '' for text in texts)).split('\x00')
+    return [value if text is not None else None for text, value in zip(texts, stripped)]
+
+# Написание навыка без псевдонима, встреченное процессом первым (ключ - casefold): навыки
+# разных пакетов, отличающиеся только регистром, получают одно название
+skill_spellings = {}
+
+# Функция для приведения навыков столбца к каноническим названиям: каждое уникальное
+# написание нормализуется один раз на пакет, затем списки навыков собираются по словарю
+def canonical_skills(skill_lists):
+    canonical = {}
+    for name in sorted({name for skills in skill_lists for name in skills}):
+        cleaned = whitespace_pattern.sub(' ', name).strip()
+        key = cleaned.casefold()
+        canonical[name] = skill_aliases.get(key) or skill_spellings.setdefault(key, cleaned)
+    return [list(dict.fromkeys(canonical[name] for name in skills)) for skills in skill_lists]
+
+currency_rates = None
+currency_rates_loaded_at = 0.0
+currency_rates_lock = threading.Lock()
+
+# Функция для получения курсов валют из справочника hh.ru: код -> число единиц валюты
+# за единицу базовой (RUR); при ошибке используются прежние курсы или пустая таблица
+def get_currency_rates():
+    global currency_rates, currency_rates_loaded_at
+    with currency_rates_lock:
+        if currency_rates is not None and time.monotonic() - currency_rates_loaded_at < postprocess_config['currency_ttl']:
+            return currency_rates
+        try:
+            response = api_get('dictionary', f'{hh_api_url}/dictionaries')
+            response.raise_for_status()
+            currency_rates = {currency['code']: currency['rate']
+                              for currency in response.json().get('currency', []) if currency.get('rate')}
+        except (requests.RequestException, ValueError) as e:
+            logging.warning(f"Не удалось загрузить курсы валют: {e}")
+            currency_rates = currency_rates or {}
+        currency_rates_loaded_at = time.monotonic()
+        return currency_rates
+
+# Функция для пересчета столбца сумм в базовую валюту
+def convert_salaries(amounts, currencies, rates):
+    base = postprocess_config['base_currency']
+    return [
+        None if amount is None
+        else amount if currency == base
+        else round(amount / rates[currency], 2) if currency in rates
+        else None
+        for amount, currency in zip(amounts, currencies)
     ]
 
-    with psycopg2.connect(**db_config) as conn:
-        drop_table(conn)
+# Постобработка пакета строк по столбцам: очистка ключевых слов от тегов подсветки,
+# канонические названия навыков, зарплата в рублях и уровень опыта
+def postprocess_rows(rows):
+    if not rows:
+        return rows
+
+    columns = dict(zip(VacancyRow._fields, map(list, zip(*rows))))
+    columns['keywords'] = strip_highlight(columns['keywords'])
+    columns['skills'] = canonical_skills(columns['skills'])
+    columns['experience_level'] = [experience_levels.get(value) for value in columns['experience_id']]
+
+    rates = get_currency_rates() if any(
+        currency not in (None, postprocess_config['base_currency']) for currency in columns['salary_currency']
+    ) else {}
+    columns['salary_from_rub'] = convert_salaries(columns['salary_from'], columns['salary_currency'], rates)
+    columns['salary_to_rub'] = convert_salaries(columns['salary_to'], columns['salary_currency'], rates)
+
+    return [VacancyRow._make(values) for values in zip(*columns.values())]
+
+# Индекс вакансий запуска: одна и та же вакансия находится многими пересекающимися запросами,
+# но детали запрашиваются только при первом появлении и только для новых или измененных вакансий
+class VacancyIndex:
+    def __init__(self, known=None):
+        self.known = known         # hh_id -> отметка изменения из базы данных (инкрементальный режим)
+        self.claimed = set()
+        self.repeated = 0
+        self.unchanged = 0
+
+    # Возвращает True, если детали вакансии нужно запросить
+    def claim(self, item):
+        hh_id = int(item['id'])
+        if hh_id in self.claimed:
+            self.repeated += 1
+            return False
+        if self.known is not None and self.known.get(hh_id) == item_updated_at(item):
+            self.unchanged += 1
+            return False
+        self.claimed.add(hh_id)
+        return True
+
+    # Вакансии страницы, обработанной с ошибкой, снова запрашиваются при следующем появлении
+    def release(self, hh_ids):
+        self.claimed.difference_update(hh_ids)
+
+    def log_stats(self):
+        logging.info(f"Вакансий с запрошенными деталями: {len(self.claimed)}, "
+                     f"повторных появлений без запроса: {self.repeated}, без изменений: {self.unchanged}")
+
+# Функция для получения навыков и отрасли по одной вакансии; для вакансии, уже обработанной
+# в этом запуске или не изменившейся с прошлого, возвращает None
+async def enrich_item(engine, city, item, index):
+    if not index.claim(item):
+        return None
+
+    company_id = item['employer'].get('id')
+    cached, industry = (True, 'Unknown') if company_id is None else get_employer_cache().lookup(company_id)
+    if cached:
+        skills = await engine.call(get_vacancy_skills, item['id'])
+    else:
+        # Запрос к API только для работодателей, которых нет в кэше или чья запись устарела
+        skills, industry = await asyncio.gather(
+            engine.call(get_vacancy_skills, item['id']), engine.call_once(('employer', company_id), load_industry, company_id)
+        )
+
+    return build_row(city, item, skills, industry)
+
+# Диапазон дат публикации (date_from, date_to) для поиска; None - без ограничения
+search_root = (None, None)
+
+# Отметка страницы 0 в контрольной точке: диапазон разбит на части, страницы не запрашиваются
+split_pages = -1
+
+# Функция для строкового ключа диапазона дат в контрольных точках ('' - поиск без дат)
+def part_key(part):
+    if part == search_root:
+        return ''
+    return '/'.join(value.isoformat() if value is not None else '' for value in part)
+
+# Функция для разбиения диапазона дат на два; None, если диапазон уже минимальный. От открытого
+# снизу диапазона отделяются последние period_days дней, закрытый делится пополам. Границы
+# отсчитываются от начала запуска (anchor), поэтому при продолжении запуска части совпадают
+def split_part(part, anchor):
+    date_from, date_to = part
+    upper = date_to or anchor
+    if date_from is None:
+        if (anchor - upper).days >= search_config['history_days']:
+            return None
+        boundary = upper - timedelta(days=search_config['period_days'])
+        return [(None, boundary), (boundary, date_to)]
+    if (upper - date_from).total_seconds() < 2 * search_config['min_partition']:
+        return None
+    middle = (date_from + (upper - date_from) / 2).replace(microsecond=0)
+    return [(date_from, middle), (middle, date_to)]
+
+# Контрольная точка: страница page из pages диапазона part пары (город, запрос) unit_id записана в базу данных
+Checkpoint = collections.namedtuple('Checkpoint', ['unit_id', 'part', 'page', 'pages'])
+SearchPage = collections.namedtuple('SearchPage', ['checkpoint', 'city', 'city_id', 'vacancy', 'items'])
+PageResult = collections.namedtuple('PageResult', ['checkpoint', 'rows', 'matches'])
+
+# Статистика стадии конвейера: пропускная способность, занятость обработчиков и глубина входной очереди
+class StageStats:
+    def __init__(self, name, workers, queue):
+        self.name = name
+        self.workers = workers
+        self.queue = queue
+        self.processed = 0
+        self.items = 0
+        self.busy_time = 0.0
+        self.started_at = time.monotonic()
+
+    def record(self, started, items=1):
+        self.processed += 1
+        self.items += items
+        self.busy_time += time.monotonic() - started
+
+    def log(self):
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        queue_size = f"{self.queue.qsize()}/{self.queue.maxsize}" if self.queue.maxsize else str(self.queue.qsize())
+        logging.info(
+            f"Стадия '{self.name}': обработано {self.processed} ({self.processed / elapsed:.2f}/с), "
+            f"строк {self.items} ({self.items / elapsed:.1f}/с), "
+            f"занятость {self.busy_time / (elapsed * self.workers):.0%}, очередь {queue_size}"
+        )
+
+# Конвейер обхода: загрузчики страниц выдачи, обработчики обогащения и запись в базу
+# данных работают параллельно и связаны ограниченными очередями, поэтому медленная
+# стадия притормаживает предыдущие, а не накапливает данные в памяти
+class CrawlPipeline:
+    def __init__(self, engine, writer, index, search_workers, enrich_workers,
+                 page_queue_size, row_queue_size, stats_interval):
+        self.engine = engine
+        self.writer = writer
+        self.index = index
+        self.search_workers = search_workers
+        self.enrich_workers = enrich_workers
+        self.stats_interval = stats_interval
+        self.search_queue = asyncio.Queue()
+        self.page_queue = asyncio.Queue(maxsize=page_queue_size)
+        self.row_queue = asyncio.Queue(maxsize=row_queue_size)
+        self.write_executor = ThreadPoolExecutor(max_workers=1)
+        self.search_stats = StageStats('search', search_workers, self.search_queue)
+        self.enrich_stats = StageStats('enrich', enrich_workers, self.page_queue)
+        self.write_stats = StageStats('write', 1, self.row_queue)
+        self.checkpoints = {}
+        self.anchor = writer.run_started_at.replace(microsecond=0)
+        self.seen = set()
+        self.failed_pages = 0
+        self.tasks = []
+
+    def log_stats(self):
+        for stats in (self.search_stats, self.enrich_stats, self.write_stats):
+            stats.log()
+
+    # Постановка в очередь страниц 1..pages-1 диапазона part, кроме записанных в предыдущих попытках
+    def enqueue_pages(self, unit, part, pages):
+        done_pages = self.checkpoints.get(unit[0], {}).get(part_key(part), (0, set()))[1]
+        for page in range(1, pages):
+            if page not in done_pages:
+                self.search_queue.put_nowait((unit, part, page))
+
+    # Постановка в очередь диапазона part: первой страницы, если она еще не записана, иначе
+    # оставшихся страниц или (для разбитого диапазона) его частей
+    def plan(self, unit, part):
+        pages, done_pages = self.checkpoints.get(unit[0], {}).get(part_key(part), (0, set()))
+        if 0 not in done_pages:
+            self.search_queue.put_nowait((unit, part, 0))
+        elif pages == split_pages:
+            for child in split_part(part, self.anchor):
+                self.plan(unit, child)
+        else:
+            self.enqueue_pages(unit, part, pages)
+
+    # Загрузка страницы выдачи. По первой странице диапазона решается, хватит ли глубины выдачи:
+    # если найдено больше max_results, диапазон делится на части, иначе в очередь ставятся
+    # остальные страницы. Вакансии первой страницы обрабатываются в обоих случаях
+    async def search_worker(self):
+        while True:
+            unit, part, page = await self.search_queue.get()
+            unit_id, city, city_id, vacancy = unit
+            started = time.monotonic()
+            try:
+                data = await self.engine.call(get_vacancies, city_id, vacancy, page, *part)
+                pages = data.get('pages', 0)
+                if page == 0 and data.get('found', 0) > search_config['max_results']:
+                    children = split_part(part, self.anchor)
+                    if children is not None:
+                        metrics.inc('hh_search_partitions_total', result='split')
+                        pages = split_pages
+                        for child in children:
+                            self.plan(unit, child)
+                    else:
+                        metrics.inc('hh_search_partitions_total', result='truncated')
+                        logging.warning(f"Запрос '{vacancy}' в городе {city}, диапазон {part_key(part)}: найдено "
+                                        f"{data['found']}, доступно {search_config['max_results']}, выдача неполная")
+                if page == 0 and pages != split_pages:
+                    self.enqueue_pages(unit, part, pages)
+
+                checkpoint = Checkpoint(unit_id, part_key(part), page, pages)
+                matched = [item for item in data.get('items', [])
+                           if not search_config['title_filter'] or vacancy.lower() in item['name'].lower()]
+                self.seen.update(int(item['id']) for item in matched)
+                self.search_stats.record(started, len(matched))
+                if matched:
+                    await self.page_queue.put(SearchPage(checkpoint, city, city_id, vacancy, matched))
+                else:
+                    await self.row_queue.put(PageResult(checkpoint, [], []))
+            except requests.RequestException as e:
+                self.failed_pages += 1
+                metrics.inc('hh_failed_pages_total', stage='search', reason='request')
+                logging.error(f"Ошибка при обработке запроса '{vacancy}' в городе {city}, страница {page}: {e}")
+            except RequestBudgetExceeded:
+                self.failed_pages += 1
+                metrics.inc('hh_failed_pages_total', stage='search', reason='budget')
+            finally:
+                self.search_queue.task_done()
+
+    # Обогащение вакансий страницы навыками и отраслью
+    async def enrich_worker(self):
+        while True:
+            search_page = await self.page_queue.get()
+            if search_page is None:
+                return
+
+            started = time.monotonic()
+            try:
+                rows = await asyncio.gather(*(
+                    enrich_item(self.engine, search_page.city, item, self.index) for item in search_page.items
+                ))
+            except requests.RequestException as e:
+                self.index.release(int(item['id']) for item in search_page.items)
+                self.failed_pages += 1
+                metrics.inc('hh_failed_pages_total', stage='enrich', reason='request')
+                logging.error(f"Ошибка при обработке запроса '{search_page.vacancy}' в городе {search_page.city}, "
+                              f"страница {search_page.checkpoint.page}: {e}")
+                continue
+            except RequestBudgetExceeded:
+                self.index.release(int(item['id']) for item in search_page.items)
+                self.failed_pages += 1
+                metrics.inc('hh_failed_pages_total', stage='enrich', reason='budget')
+                continue
+
+            rows = [row for row in rows if row is not None]
+            self.enrich_stats.record(started, len(rows))
+            await self.row_queue.put(PageResult(search_page.checkpoint, rows, [
+                (int(item['id']), search_page.vacancy, search_page.city_id) for item in search_page.items
+            ]))
+
+    # Запись строк в отдельном потоке; при отсутствии новых строк буфер сбрасывается по таймеру
+    async def write_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                result = await asyncio.wait_for(self.row_queue.get(), timeout=self.writer.flush_interval)
+            except asyncio.TimeoutError:
+                await loop.run_in_executor(self.write_executor, self.writer.flush)
+                continue
+            if result is None:
+                return
+
+            started = time.monotonic()
+            await loop.run_in_executor(self.write_executor, self.writer.add, result.rows, result.matches, result.checkpoint)
+            self.write_stats.record(started, len(result.rows))
+
+    async def monitor(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            self.log_stats()
+
+    # Ожидание завершения стадии; ошибка любого обработчика прерывает обход
+    async def wait_for(self, awaitable):
+        waiter = asyncio.ensure_future(awaitable)
+        while not waiter.done():
+            done, _ = await asyncio.wait([waiter, *self.tasks], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is not waiter and not task.cancelled() and task.exception() is not None:
+                    waiter.cancel()
+                    raise task.exception()
+            self.tasks = [task for task in self.tasks if not task.done()]
+        return waiter.result()
+
+    # units - пары (unit_id, город, id города, запрос), checkpoints - unit_id -> {ключ диапазона:
+    # (число страниц, множество записанных страниц)} по результатам предыдущих попыток,
+    # root - диапазон дат публикации всего обхода
+    async def run(self, units, checkpoints, root=search_root):
+        self.checkpoints = checkpoints
+        for unit in units:
+            self.plan(tuple(unit), root)
+
+        searchers = [asyncio.ensure_future(self.search_worker()) for _ in range(self.search_workers)]
+        enrichers = [asyncio.ensure_future(self.enrich_worker()) for _ in range(self.enrich_workers)]
+        writer = asyncio.ensure_future(self.write_worker())
+        monitor = asyncio.ensure_future(self.monitor())
+        self.tasks = searchers + enrichers + [writer]
+        try:
+            await self.wait_for(self.search_queue.join())
+            for _ in enrichers:
+                await self.wait_for(self.page_queue.put(None))
+            await self.wait_for(asyncio.gather(*enrichers))
+            await self.wait_for(self.row_queue.put(None))
+            await self.wait_for(writer)
+        finally:
+            for task in searchers + enrichers + [writer, monitor]:
+                task.cancel()
+            self.write_executor.shutdown(wait=True)
+            self.log_stats()
+
+# Функция для обхода набора пар (город, запрос) общим конвейером; возвращает конвейер
+# с множеством id найденных вакансий (seen) и числом страниц с ошибками (failed_pages)
+async def crawl_vacancies(engine, writer, index, units, checkpoints, search_from=None):
+    pipeline = CrawlPipeline(engine, writer, index, **pipeline_config)
+    await pipeline.run(units, checkpoints, (search_from, None))
+    return pipeline
+
+# Функция для загрузки отметок изменения уже сохраненных вакансий
+def load_known_vacancies(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT hh_id, source_updated_at FROM vacancies WHERE hh_id IS NOT NULL")
+        return dict(cursor.fetchall())
+
+# Столбцы таблицы vacancies, заполняемые при записи строк
+vacancy_columns = (
+    'hh_id', 'city', 'employer_id', 'title', 'keywords', 'experience', 'experience_level', 'salary_from',
+    'salary_to', 'salary_currency', 'salary_gross', 'salary_from_rub', 'salary_to_rub', 'url', 'published_at',
+    'source_updated_at', 'first_seen_at', 'last_seen_at'
+)
+
+# Функция для добавления названий в справочник (industries); возвращает название -> id.
+# Названия добавляются в отсортированном порядке, чтобы параллельные обработчики не блокировали друг друга
+def upsert_names(cursor, table, names):
+    names = sorted(set(names))
+    if not names:
+        return {}
+    psycopg2.extras.execute_values(
+        cursor, f"INSERT INTO {table} (name) VALUES %s ON CONFLICT (name) DO NOTHING", [(name,) for name in names]
+    )
+    cursor.execute(f"SELECT name, id FROM {table} WHERE name = ANY(%s)", (names,))
+    return dict(cursor.fetchall())
+
+# Функция для добавления навыков в справочник; возвращает название -> id. Навык ищется без учета
+# регистра (lower() в базе), поэтому написание из другого процесса или запуска получает id первой
+# записи; при правилах сортировки C регистр сравнивается только у латиницы
+def upsert_skills(cursor, names):
+    names = sorted(set(names))
+    if not names:
+        return {}
+    psycopg2.extras.execute_values(
+        cursor, "INSERT INTO skills (name) VALUES %s ON CONFLICT DO NOTHING", [(name,) for name in names]
+    )
+    cursor.execute(
+        "SELECT n.name, s.id FROM unnest(%s::TEXT[]) AS n (name) JOIN skills s ON lower(s.name) = lower(n.name)",
+        (names,)
+    )
+    return dict(cursor.fetchall())
+
+# Функция для добавления и обновления работодателей строк; возвращает id работодателя для каждой строки.
+# Работодатели без id hh.ru (анонимные вакансии) различаются по названию
+def upsert_employers(cursor, rows):
+    industry_ids = upsert_names(cursor, 'industries', [row.industry for row in rows if row.industry])
+    known = {}
+    anonymous = set()
+    for row in rows:
+        if row.employer_hh_id is not None:
+            known[row.employer_hh_id] = (row.company, industry_ids.get(row.industry))
+        elif row.company:
+            anonymous.add(row.company)
+
+    known_ids = {}
+    anonymous_ids = {}
+    if known:
+        psycopg2.extras.execute_values(cursor, """
+            INSERT INTO employers (hh_id, name, industry_id) VALUES %s
+            ON CONFLICT (hh_id) DO UPDATE
+                SET name = EXCLUDED.name, industry_id = COALESCE(EXCLUDED.industry_id, employers.industry_id)
+                WHERE (employers.name, employers.industry_id)
+                    IS DISTINCT FROM (EXCLUDED.name, COALESCE(EXCLUDED.industry_id, employers.industry_id))
+        """, [(hh_id,) + known[hh_id] for hh_id in sorted(known)])
+        cursor.execute("SELECT hh_id, id FROM employers WHERE hh_id = ANY(%s)", (list(known),))
+        known_ids = dict(cursor.fetchall())
+    if anonymous:
+        psycopg2.extras.execute_values(
+            cursor, "INSERT INTO employers (name) VALUES %s ON CONFLICT (name) WHERE hh_id IS NULL DO NOTHING",
+            [(name,) for name in sorted(anonymous)]
+        )
+        cursor.execute("SELECT name, id FROM employers WHERE hh_id IS NULL AND name = ANY(%s)", (list(anonymous),))
+        anonymous_ids = dict(cursor.fetchall())
+    return [known_ids.get(row.employer_hh_id) if row.employer_hh_id is not None else anonymous_ids.get(row.company)
+            for row in rows]
+
+# Функция для экранирования значения в текстовом формате COPY
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+# Пакетная запись строк: строки копятся в буфере и записываются одной транзакцией
+# при достижении batch_size или по истечении flush_interval. В полном режиме повтор
+# вакансии пропускается (остается первая строка), в инкрементальном - новая или
+# измененная вакансия обновляет строку с тем же hh_id
+class VacancyWriter:
+    def __init__(self, conn, run_id, run_started_at, incremental, method, batch_size, flush_interval):
+        self.conn = conn
+        self.run_id = run_id
+        self.run_started_at = run_started_at
+        self.incremental = incremental
+        self.method = method
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = {}
+        self.matches = set()
+        self.checkpoints = []
+        self.flushed_at = time.monotonic()
+        self.rows_written = 0
+        self.write_time = 0.0
+
+    # rows - строки для записи, matches - найденные вакансии (hh_id, запрос, id города),
+    # checkpoint - контрольная точка страницы; все записываются в одной транзакции,
+    # поэтому записанная страница не обходится повторно
+    def add(self, rows, matches=(), checkpoint=None):
+        for row in rows:
+            self.buffer.setdefault(row.hh_id, row)
+        self.matches.update(matches)
+        if checkpoint is not None:
+            self.checkpoints.append(checkpoint)
+        if (len(self.buffer) >= self.batch_size
+                or time.monotonic() - self.flushed_at >= self.flush_interval):
+            self.flush()
+
+    # Записанные строки попадают в журнал изменений запуска: у вставленной строки xmax = 0,
+    # у обновленной по ON CONFLICT - id обновившей транзакции. Полный режим перезаписывает таблицу
+    # целиком, поэтому его строки в журнал не пишутся: признак такого запуска - crawl_runs.incremental
+    def insert_query(self, source):
+        columns = ', '.join(vacancy_columns)
+        conflict_action = """
+            DO UPDATE SET
+                city = EXCLUDED.city, employer_id = EXCLUDED.employer_id, title = EXCLUDED.title,
+                keywords = EXCLUDED.keywords, experience = EXCLUDED.experience,
+                experience_level = EXCLUDED.experience_level,
+                salary_from = EXCLUDED.salary_from, salary_to = EXCLUDED.salary_to,
+                salary_currency = EXCLUDED.salary_currency, salary_gross = EXCLUDED.salary_gross,
+                salary_from_rub = EXCLUDED.salary_from_rub, salary_to_rub = EXCLUDED.salary_to_rub, url = EXCLUDED.url,
+                published_at = EXCLUDED.published_at, source_updated_at = EXCLUDED.source_updated_at,
+                last_seen_at = EXCLUDED.last_seen_at, archived = FALSE, archived_at = NULL, updated_at = now()
+        """
+        # В полном режиме повтор пропускается при совпадении любого уникального ключа (hh_id или url)
+        if not self.incremental:
+            return f"INSERT INTO vacancies ({columns}) {source} ON CONFLICT DO NOTHING"
+        insert = f"INSERT INTO vacancies ({columns}) {source} ON CONFLICT (hh_id) {conflict_action}"
+        return f"""
+            WITH written AS ({insert} RETURNING hh_id, xmax = 0 AS inserted)
+            INSERT INTO vacancy_changes (run_id, hh_id, change)
+            SELECT {int(self.run_id)}, hh_id, CASE WHEN inserted THEN 'insert' ELSE 'update' END FROM written
+            ON CONFLICT DO NOTHING
+        """
+
+    # COPY во временную таблицу и перенос в vacancies одним INSERT ... SELECT
+    def write_copy(self, cursor, rows):
+        columns = ', '.join(vacancy_columns)
+        cursor.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS vacancies_stage
+            ON COMMIT DELETE ROWS
+            AS SELECT {columns} FROM vacancies WITH NO DATA
+        """)
+        data = io.StringIO()
+        for row in rows:
+            data.write('\t'.join(copy_value(value) for value in row) + '\n')
+        data.seek(0)
+        cursor.copy_expert(f"COPY vacancies_stage ({columns}) FROM STDIN", data)
+        cursor.execute(self.insert_query(f"SELECT {columns} FROM vacancies_stage"))
+
+    def write_values(self, cursor, rows):
+        psycopg2.extras.execute_values(cursor, self.insert_query("VALUES %s"), rows, page_size=self.batch_size)
+
+    # Навыки вакансий: в инкрементальном режиме набор навыков обновленной вакансии заменяется
+    def write_skills(self, cursor, rows):
+        skill_ids = upsert_skills(cursor, [skill for row in rows for skill in row.skills])
+        if self.incremental:
+            cursor.execute("DELETE FROM vacancy_skills WHERE vacancy_id = ANY(%s)", ([row.hh_id for row in rows],))
+        pairs = sorted({(row.hh_id, skill_ids[skill]) for row in rows for skill in row.skills})
+        if pairs:
+            psycopg2.extras.execute_values(
+                cursor, "INSERT INTO vacancy_skills (vacancy_id, skill_id) VALUES %s ON CONFLICT DO NOTHING", pairs,
+                page_size=1000
+            )
+
+    def write_rows(self, cursor, rows):
+        rows = postprocess_rows(rows)
+        vacancy_rows = [
+            (row.hh_id, row.city, employer_id, row.title, row.keywords, row.experience, row.experience_level,
+             row.salary_from, row.salary_to, row.salary_currency, row.salary_gross, row.salary_from_rub,
+             row.salary_to_rub, row.url, row.published_at, row.source_updated_at,
+             self.run_started_at, self.run_started_at)
+            for row, employer_id in zip(rows, upsert_employers(cursor, rows))
+        ]
+        if self.method == 'copy':
+            self.write_copy(cursor, vacancy_rows)
+        else:
+            self.write_values(cursor, vacancy_rows)
+        self.write_skills(cursor, rows)
+
+    def flush(self):
+        self.flushed_at = time.monotonic()
+        if not self.buffer and not self.matches and not self.checkpoints:
+            return
+
+        rows = list(self.buffer.values())
+        started = time.monotonic()
+        with self.conn.cursor() as cursor:
+            if rows:
+                self.write_rows(cursor, rows)
+            if self.incremental and self.matches:
+                mark_seen_vacancies(self.conn, {match[0] for match in self.matches}, self.run_started_at, self.run_id)
+            if self.matches:
+                psycopg2.extras.execute_values(cursor, """
+                    INSERT INTO vacancy_matches (hh_id, query, city_id, first_matched_at, last_matched_at)
+                    VALUES %s
+                    ON CONFLICT (hh_id, query, city_id) DO UPDATE SET last_matched_at = EXCLUDED.last_matched_at
+                """, [match + (self.run_started_at, self.run_started_at) for match in self.matches])
+            if self.checkpoints:
+                psycopg2.extras.execute_values(
+                    cursor,
+                    "INSERT INTO crawl_checkpoints (unit_id, part, page, pages) VALUES %s ON CONFLICT DO NOTHING",
+                    self.checkpoints
+                )
+        self.conn.commit()
+        self.buffer = {}
+        self.matches = set()
+        self.checkpoints = []
+        if not rows:
+            return
+
+        elapsed = time.monotonic() - started
+        self.rows_written += len(rows)
+        self.write_time += elapsed
+        metrics.observe('hh_db_write_seconds', elapsed, method=self.method)
+        metrics.inc('hh_rows_written_total', len(rows))
+        logging.info(f"Записано строк: {len(rows)} за {elapsed:.2f} с ({len(rows) / max(elapsed, 1e-6):.0f} строк/с)")
+
+    def close(self):
+        self.flush()
+        rows_per_second = self.rows_written / max(self.write_time, 1e-6)
+        logging.info(f"Всего записано строк: {self.rows_written} за {self.write_time:.2f} с ({rows_per_second:.0f} строк/с)")
+
+# Функция для отметки вакансий, найденных в выдаче текущего запуска; возврат из архива
+# записывается в журнал изменений как обновление
+def mark_seen_vacancies(conn, seen, run_started_at, run_id):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO vacancy_changes (run_id, hh_id, change)
+            SELECT %s, hh_id, 'update' FROM vacancies WHERE hh_id = ANY(%s) AND archived
+            ON CONFLICT DO NOTHING
+        """, (run_id, list(seen)))
+        cursor.execute("""
+            UPDATE vacancies
+            SET last_seen_at = %s, archived = FALSE, archived_at = NULL,
+                updated_at = CASE WHEN archived THEN now() ELSE updated_at END
+            WHERE hh_id = ANY(%s) AND (last_seen_at IS NULL OR last_seen_at < %s)
+        """, (run_started_at, list(seen), run_started_at))
+
+# Функция для архивирования вакансий, пропавших из выдачи
+def archive_missing_vacancies(conn, run_started_at, run_id):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            WITH archived AS (
+                UPDATE vacancies
+                SET archived = TRUE, archived_at = %s, updated_at = now()
+                WHERE NOT archived AND (last_seen_at IS NULL OR last_seen_at < %s)
+                RETURNING hh_id
+            )
+            INSERT INTO vacancy_changes (run_id, hh_id, change)
+            SELECT %s, hh_id, 'archive' FROM archived
+            ON CONFLICT DO NOTHING
+        """, (run_started_at, run_started_at, run_id))
+        logging.info(f"Вакансий перенесено в архив: {cursor.rowcount}")
+
+# Функция для создания таблиц запусков и очереди пар (город, запрос); search_from запуска -
+# начало диапазона дат публикации при обходе только новых вакансий (NULL - вся выдача)
+def create_crawl_tables(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_runs (
+                id SERIAL PRIMARY KEY,
+                incremental BOOLEAN NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'running',
+                started_at TIMESTAMPTZ NOT NULL,
+                finished_at TIMESTAMPTZ,
+                search_from TIMESTAMPTZ
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_units (
+                id SERIAL PRIMARY KEY,
+                run_id INTEGER NOT NULL REFERENCES crawl_runs (id) ON DELETE CASCADE,
+                city VARCHAR(50) NOT NULL,
+                city_id INTEGER NOT NULL,
+                query VARCHAR(200) NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                worker VARCHAR(100),
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claimed_at TIMESTAMPTZ,
+                finished_at TIMESTAMPTZ,
+                UNIQUE (run_id, city_id, query)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS crawl_units_run_status ON crawl_units (run_id, status)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_checkpoints (
+                unit_id INTEGER NOT NULL REFERENCES crawl_units (id) ON DELETE CASCADE,
+                part VARCHAR(100) NOT NULL DEFAULT '',
+                page INTEGER NOT NULL,
+                pages INTEGER NOT NULL,
+                completed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (unit_id, part, page)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_run_metrics (
+                id SERIAL PRIMARY KEY,
+                run_id INTEGER NOT NULL REFERENCES crawl_runs (id) ON DELETE CASCADE,
+                worker VARCHAR(100) NOT NULL,
+                started_at TIMESTAMPTZ NOT NULL,
+                finished_at TIMESTAMPTZ NOT NULL,
+                duration REAL NOT NULL,
+                api_requests INTEGER NOT NULL,
+                rows_written INTEGER NOT NULL,
+                metrics JSONB NOT NULL
+            )
+        """)
+    conn.commit()
+
+# Функция для сохранения итогов обработчика за запуск: длительности, числа запросов
+# и записанных строк, а также изменения всех метрик процесса за время его работы
+def save_run_metrics(conn, run_id, worker, started_at, api_requests, rows_written, summary):
+    finished_at = datetime.now(timezone.utc)
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO crawl_run_metrics
+                (run_id, worker, started_at, finished_at, duration, api_requests, rows_written, metrics)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (run_id, worker, started_at, finished_at, (finished_at - started_at).total_seconds(),
+              api_requests, rows_written, psycopg2.extras.Json(summary)))
+    conn.commit()
+
+# Функция для создания запуска и постановки всех пар (город, запрос) в очередь;
+# в полном режиме таблица vacancies пересоздается
+def start_crawl_run(conn, incremental, search_from=None):
+    create_crawl_tables(conn)
+
+    with conn.cursor() as cursor:
+        # Проверка и создание запуска выполняются по одному, пока транзакция держит блокировку
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (zlib.crc32(b"hh_crawl_runs"),))
+        live_run_id = get_live_crawl_run(cursor)
+        if live_run_id is not None:
+            conn.rollback()
+            logging.warning(f"Запуск {live_run_id} еще выполняется, новый запуск не создан.")
+            return None
+
+        # Незавершенные запуски без активности (обработчики упали или остановились) заменяются
+        # новым; продолжить их после этого нельзя
+        cursor.execute("UPDATE crawl_runs SET status = 'abandoned' WHERE status IN ('running', 'incomplete')")
+        cursor.execute(
+            "INSERT INTO crawl_runs (incremental, started_at, search_from) VALUES (%s, %s, %s) RETURNING id",
+            (incremental, datetime.now(timezone.utc), search_from)
+        )
+        run_id = cursor.fetchone()[0]
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO crawl_units (run_id, city, city_id, query) VALUES %s",
+            [(run_id, city, city_id, vacancy) for city, city_id in cities.items() for vacancy in vacancies]
+        )
+    conn.commit()
+
+    # Таблица пересоздается, только когда запуск уже создан и другие не начнутся
+    try:
+        if not incremental:
+            drop_table(conn)
         create_table(conn)
+        create_analytics_tables(conn)
+    except Exception:
+        conn.rollback()
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE crawl_runs SET status = 'abandoned' WHERE id = %s", (run_id,))
+        conn.commit()
+        raise
 
-        for city, city_id in cities.items():
-            for vacancy in vacancies:
-                page = 0
-                while True:
-                    try:
-                        data = get_vacancies(city_id, vacancy, page)
-
-                        if not data.get('items'):
-                            break
-
-                        with conn.cursor() as cursor:
-                            for item in data['items']:
-                                if vacancy.lower() not in item['name'].lower():
-                                    continue  # Пропустить, если название вакансии не совпадает
-
-                                title = f"{item['name']} ({city})"
-                                keywords = item['snippet'].get('requirement', '')
-                                skills = get_vacancy_skills(item['id'])
-                                company = item['employer']['name']
-                                industry = get_industry(item['employer'].get('id'))
-                                experience = item['experience'].get('name', '')
-                                salary = item['salary']
-                                if salary is None:
-                                    salary = "з/п не указана"
-                                else:
-                                    salary = salary.get('from', '')
-                                url = item['alternate_url']
-
-                                insert_query = """
-                                    INSERT INTO vacancies 
-                                    (city, company, industry, title, keywords, skills, experience, salary, url) 
-                                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                                """
-                                cursor.execute(insert_query,
-                                               (city, company, industry, title, keywords, skills, experience, salary, url))
-
-                            if page >= data['pages'] - 1:
-                                break
-
-                            page += 1
-
-                            # Задержка между запросами в пределах 1-3 секунд
-                            time.sleep(random.uniform(3, 6))
-
-                    except requests.HTTPError as e:
-                        logging.error(f"Ошибка при обработке города {city}: {e}")
-                        continue  # Перейти к следующему городу, если произошла ошибка
+    logging.info(f"Создан запуск {run_id}: в очереди {len(cities) * len(vacancies)} пар (город, запрос).")
+    return run_id
+
+# Функция для поиска выполняющегося запуска: созданного за время аренды пары (shard_config['lease'])
+# или с парами, аренда которых не истекла. Остановленные запуски ('incomplete') не выполняются
+def get_live_crawl_run(cursor):
+    cursor.execute("""
+        SELECT r.id FROM crawl_runs r
+        WHERE r.status = 'running'
+          AND (r.started_at > now() - %s * INTERVAL '1 second'
+               OR EXISTS (
+                   SELECT 1 FROM crawl_units u
+                   WHERE u.run_id = r.id AND u.status = 'claimed'
+                     AND u.claimed_at > now() - %s * INTERVAL '1 second'
+               ))
+        ORDER BY r.id DESC LIMIT 1
+    """, (shard_config['lease'], shard_config['lease']))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+# Функция для получения запуска по id или последнего из запусков с одним из статусов statuses
+def get_crawl_run(conn, run_id=None, statuses=('running',)):
+    with conn.cursor() as cursor:
+        if run_id is None:
+            cursor.execute("""
+                SELECT id, incremental, started_at, search_from FROM crawl_runs
+                WHERE status = ANY(%s) ORDER BY id DESC LIMIT 1
+            """, (list(statuses),))
+        else:
+            cursor.execute("SELECT id, incremental, started_at, search_from FROM crawl_runs WHERE id = %s", (run_id,))
+        return cursor.fetchone()
+
+# Функция для захвата пар из очереди; незавершенные пары с истекшей арендой
+# (обработчик упал или потерял связь) снова становятся доступными
+def claim_crawl_units(conn, run_id, worker, limit, lease):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            UPDATE crawl_units u
+            SET status = 'claimed', worker = %s, claimed_at = now(), attempts = u.attempts + 1
+            WHERE u.id IN (
+                SELECT id FROM crawl_units
+                WHERE run_id = %s
+                  AND (status = 'pending'
+                       OR (status = 'claimed' AND claimed_at < now() - %s * INTERVAL '1 second'))
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING u.id, u.city, u.city_id, u.query
+        """, (worker, run_id, lease, limit))
+        units = cursor.fetchall()
+    conn.commit()
+    return units
+
+# Функция для загрузки контрольных точек пар:
+# unit_id -> {ключ диапазона дат: (число страниц, множество записанных страниц)}
+def load_crawl_checkpoints(conn, unit_ids):
+    checkpoints = {}
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT unit_id, part, page, pages FROM crawl_checkpoints WHERE unit_id = ANY(%s)", (unit_ids,))
+        for unit_id, part, page, pages in cursor.fetchall():
+            checkpoints.setdefault(unit_id, {}).setdefault(part, (pages, set()))[1].add(page)
+    return checkpoints
+
+# Функция для возврата в очередь пар запуска перед его продолжением: неудачные получают попытки
+# заново, захваченные возвращаются, только если их аренда истекла (обработчик упал)
+def release_crawl_units(conn, run_id):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            UPDATE crawl_units
+            SET status = 'pending', finished_at = NULL,
+                attempts = CASE WHEN status = 'failed' THEN 0 ELSE attempts END
+            WHERE run_id = %s
+              AND (status = 'failed'
+                   OR (status = 'claimed' AND claimed_at < now() - %s * INTERVAL '1 second'))
+        """, (run_id, shard_config['lease']))
+        released = cursor.rowcount
+    conn.commit()
+    return released
+
+# Функция для отметки обработанных пар; пара с ошибками возвращается в очередь,
+# пока не исчерпаны попытки
+def finish_crawl_units(conn, unit_ids, ok):
+    with conn.cursor() as cursor:
+        if ok:
+            cursor.execute("""
+                UPDATE crawl_units SET status = 'done', finished_at = now() WHERE id = ANY(%s)
+            """, (unit_ids,))
+        else:
+            cursor.execute("""
+                UPDATE crawl_units
+                SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                    finished_at = CASE WHEN attempts >= %s THEN now() END
+                WHERE id = ANY(%s)
+            """, (shard_config['max_attempts'], shard_config['max_attempts'], unit_ids))
+    conn.commit()
 
+# Функция для завершения запуска, когда в очереди не осталось необработанных пар;
+# завершает запуск ровно один обработчик, он же архивирует пропавшие вакансии
+def finish_crawl_run(conn, run_id):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            UPDATE crawl_runs SET status = 'finished', finished_at = now()
+            WHERE id = %s AND status IN ('running', 'incomplete')
+              AND NOT EXISTS (
+                  SELECT 1 FROM crawl_units WHERE run_id = %s AND status IN ('pending', 'claimed')
+              )
+            RETURNING incremental, started_at, search_from,
+                (SELECT COUNT(*) FROM crawl_units WHERE run_id = %s AND status = 'failed')
+        """, (run_id, run_id, run_id))
+        row = cursor.fetchone()
+
+    if row is None:
         conn.commit()
+        return False
 
-    logging.info("Парсинг завершен. Данные сохранены в базе данных PostgreSQL.")
+    incremental, run_started_at, search_from, failed_units = row
+    if incremental and failed_units:
+        logging.warning(f"Пар, обработанных с ошибками: {failed_units}, архивирование пропавших вакансий пропущено.")
+    elif search_from is not None:
+        logging.info("Обход только новых вакансий, архивирование пропавших вакансий пропущено.")
+    elif incremental:
+        archive_missing_vacancies(conn, run_started_at, run_id)
+    refresh_run_analytics(conn, run_id, incremental)
+    conn.commit()
+
+    logging.info(f"Запуск {run_id} завершен.")
+    return True
+
+# Функция для остановки запуска, который обработчики не завершили (исчерпан бюджет запросов,
+# пары с ошибками): остановленный запуск не мешает новым и продолжается командой --resume.
+# Пока другие обработчики держат его пары, запуск остается выполняющимся
+def pause_crawl_run(conn, run_id):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            UPDATE crawl_runs SET status = 'incomplete'
+            WHERE id = %s AND status = 'running'
+              AND NOT EXISTS (
+                  SELECT 1 FROM crawl_units
+                  WHERE run_id = %s AND status = 'claimed' AND claimed_at > now() - %s * INTERVAL '1 second'
+              )
+        """, (run_id, run_id, shard_config['lease']))
+    conn.commit()
+
+# Функция для создания журнала изменений вакансий и таблиц агрегатов по дате публикации. Таблицы
+# не удаляются при полной перезагрузке: журнал прошлых запусков сохраняется
+def create_analytics_tables(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS vacancy_changes (
+                run_id INTEGER NOT NULL,
+                hh_id BIGINT NOT NULL,
+                change VARCHAR(10) NOT NULL,
+                changed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (run_id, hh_id, change)
+            );
+            CREATE INDEX IF NOT EXISTS vacancy_changes_changed_at ON vacancy_changes (changed_at);
+            CREATE TABLE IF NOT EXISTS skill_stats_daily (
+                published_date DATE NOT NULL,
+                run_id INTEGER NOT NULL,
+                skill_id INTEGER NOT NULL REFERENCES skills (id),
+                vacancies INTEGER NOT NULL,
+                PRIMARY KEY (published_date, skill_id)
+            );
+            CREATE TABLE IF NOT EXISTS salary_stats_daily (
+                published_date DATE NOT NULL,
+                run_id INTEGER NOT NULL,
+                city VARCHAR(50) NOT NULL,
+                query VARCHAR(200) NOT NULL,
+                vacancies INTEGER NOT NULL,
+                with_salary INTEGER NOT NULL,
+                salary_p25 NUMERIC,
+                salary_median NUMERIC,
+                salary_p75 NUMERIC,
+                salary_avg NUMERIC,
+                PRIMARY KEY (published_date, city, query)
+            );
+            CREATE TABLE IF NOT EXISTS industry_stats_daily (
+                published_date DATE NOT NULL,
+                run_id INTEGER NOT NULL,
+                industry_id INTEGER REFERENCES industries (id),
+                vacancies INTEGER NOT NULL,
+                employers INTEGER NOT NULL,
+                salary_median NUMERIC
+            );
+            CREATE INDEX IF NOT EXISTS industry_stats_daily_published_date ON industry_stats_daily (published_date);
+        """)
+    conn.commit()
+
+# Зарплата вакансии в рублях для агрегатов: середина вилки или ее известная граница
+salary_rub_expression = "COALESCE((v.salary_from_rub + v.salary_to_rub) / 2, v.salary_from_rub, v.salary_to_rub)"
+
+# Дата публикации вакансии, как в выгрузке
+published_date_expression = "(v.published_at AT TIME ZONE 'UTC')::DATE"
+
+# Агрегаты по активным (неархивным) вакансиям, опубликованным начиная с даты since
+run_analytics_queries = {
+    'skill_stats_daily': f"""
+        INSERT INTO skill_stats_daily (published_date, run_id, skill_id, vacancies)
+        SELECT {published_date_expression}, %(run_id)s, vs.skill_id, COUNT(*)
+        FROM vacancy_skills vs
+        JOIN vacancies v ON v.hh_id = vs.vacancy_id
+        WHERE NOT v.archived AND {published_date_expression} >= %(since)s
+        GROUP BY 1, vs.skill_id
+    """,
+    'salary_stats_daily': f"""
+        INSERT INTO salary_stats_daily (
+            published_date, run_id, city, query, vacancies, with_salary, salary_p25, salary_median, salary_p75,
+            salary_avg
+        )
+        SELECT
+            {published_date_expression}, %(run_id)s, v.city, m.query, COUNT(*), COUNT({salary_rub_expression}),
+            percentile_cont(0.25) WITHIN GROUP (ORDER BY {salary_rub_expression}),
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY {salary_rub_expression}),
+            percentile_cont(0.75) WITHIN GROUP (ORDER BY {salary_rub_expression}),
+            ROUND(AVG({salary_rub_expression}))
+        FROM vacancies v
+        JOIN vacancy_matches m ON m.hh_id = v.hh_id
+        WHERE NOT v.archived AND v.city IS NOT NULL AND {published_date_expression} >= %(since)s
+        GROUP BY 1, v.city, m.query
+    """,
+    'industry_stats_daily': f"""
+        INSERT INTO industry_stats_daily (published_date, run_id, industry_id, vacancies, employers, salary_median)
+        SELECT
+            {published_date_expression}, %(run_id)s, e.industry_id, COUNT(*), COUNT(DISTINCT v.employer_id),
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY {salary_rub_expression})
+        FROM vacancies v
+        LEFT JOIN employers e ON e.id = v.employer_id
+        WHERE NOT v.archived AND {published_date_expression} >= %(since)s
+        GROUP BY 1, e.industry_id
+    """
+}
+
+# Функция для обновления аналитики в конце запуска: агрегаты пересчитываются только за дни
+# публикации, начиная с самого раннего дня вакансий, измененных запуском (после полной
+# перезагрузки - за все дни); журнал изменений старше срока хранения удаляется
+@metrics.timed('hh_analytics_seconds')
+def refresh_run_analytics(conn, run_id, incremental):
+    with conn.cursor() as cursor:
+        if incremental:
+            cursor.execute(f"""
+                SELECT MIN({published_date_expression})
+                FROM vacancy_changes c
+                JOIN vacancies v ON v.hh_id = c.hh_id
+                WHERE c.run_id = %s
+            """, (run_id,))
+        else:
+            cursor.execute(f"SELECT MIN({published_date_expression}) FROM vacancies v")
+        since = cursor.fetchone()[0]
+
+        if since is not None:
+            params = {'since': since, 'run_id': run_id}
+            for table, query in run_analytics_queries.items():
+                cursor.execute(f"DELETE FROM {table} WHERE published_date >= %(since)s", params)
+                cursor.execute(query, params)
+
+        cursor.execute(
+            "DELETE FROM vacancy_changes WHERE changed_at < now() - make_interval(days => %s)",
+            (analytics_config['changes_retention_days'],)
+        )
+        cursor.execute("SELECT change, COUNT(*) FROM vacancy_changes WHERE run_id = %s GROUP BY change", (run_id,))
+        changes = dict(cursor.fetchall())
+    if not incremental:
+        logging.info(f"Запуск {run_id}: полная перезагрузка, агрегаты пересчитаны за все дни.")
+    else:
+        logging.info(f"Изменения запуска {run_id}: добавлено {changes.get('insert', 0)}, "
+                     f"обновлено {changes.get('update', 0)}, в архиве {changes.get('archive', 0)}")
+
+# Обработчик очереди: забирает пары (город, запрос), обходит их и отмечает выполненными
+async def crawl_worker(conn, run, worker):
+    run_id, incremental, run_started_at, search_from = run
+    index = VacancyIndex(load_known_vacancies(conn) if incremental else None)
+    engine = FetchEngine(fetch_config['concurrency'], fetch_config['request_budget'])
+    writer = VacancyWriter(conn, run_id, run_started_at, incremental, **writer_config)
+    for limiter in rate_limiters.values():
+        limiter.reset_stats()
+    worker_started_at = datetime.now(timezone.utc)
+    metrics_before = metrics.snapshot()
+
+    units_done = 0
+    seen_total = 0
+    open_employer_cache()
+    open_http_cache()
+    try:
+        while not engine.budget_exhausted:
+            units = claim_crawl_units(conn, run_id, worker, shard_config['units_per_claim'], shard_config['lease'])
+            if not units:
+                break
+
+            checkpoints = load_crawl_checkpoints(conn, [unit[0] for unit in units])
+            pipeline = await crawl_vacancies(engine, writer, index, units, checkpoints, search_from)
+            writer.flush()
+            finish_crawl_units(conn, [unit[0] for unit in units], ok=pipeline.failed_pages == 0)
+
+            units_done += len(units)
+            seen_total += len(pipeline.seen)
+        writer.close()
+    finally:
+        engine.close()
+        close_employer_cache()
+        close_http_cache()
+
+    logging.info(f"Обработчик {worker}: пар {units_done}, запросов к API {engine.requests_made}, "
+                 f"найдено вакансий {seen_total}, передано на запись {writer.rows_written}")
+    index.log_stats()
+    for limiter in rate_limiters.values():
+        limiter.log_stats()
+    save_run_metrics(conn, run_id, worker, worker_started_at, engine.requests_made, writer.rows_written,
+                     metrics.summary(metrics_before))
+
+# Функция для запуска одного обработчика очереди в текущем процессе
+def run_crawl_worker(run_id=None):
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    with psycopg2.connect(**db_config) as conn:
+        create_crawl_tables(conn)
+        run = get_crawl_run(conn, run_id)
+        if run is None:
+            logging.info("Нет незавершенных запусков обхода.")
+            return False
+
+        asyncio.run(crawl_worker(conn, run, worker))
+        if finish_crawl_run(conn, run[0]):
+            return True
+        pause_crawl_run(conn, run[0])
+        return False
+
+# Функция процесса-обработчика: настройки и уровень логирования берутся из родительского процесса
+def run_crawl_worker_process(run_id, config, log_level):
+    setup_logging(log_level)
+    apply_config(config, 'настройки родительского процесса')
+    configure_runtime()
+    run_crawl_worker(run_id)
+
+# Функция для запуска нескольких обработчиков очереди в отдельных процессах
+def run_crawl_workers(run_id=None, processes=1):
+    if processes <= 1:
+        return run_crawl_worker(run_id)
+
+    # Запуск определяется заранее: его может завершить любой из обработчиков
+    if run_id is None:
+        with psycopg2.connect(**db_config) as conn:
+            run = get_crawl_run(conn)
+        if run is None:
+            logging.info("Нет незавершенных запусков обхода.")
+            return False
+        run_id = run[0]
+
+    config = current_config()
+    log_level = logging.getLogger().getEffectiveLevel()
+    workers = [multiprocessing.Process(target=run_crawl_worker_process, args=(run_id, config, log_level))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    with psycopg2.connect(**db_config) as conn:
+        if finish_crawl_run(conn, run_id):
+            return True
+        pause_crawl_run(conn, run_id)
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT status FROM crawl_runs WHERE id = %s", (run_id,))
+            return cursor.fetchone()[0] == 'finished'
+
+# Функция для продолжения незавершенного запуска (последнего или с заданным id) после сбоя:
+# обходятся только пары и страницы, не записанные в базу данных. Как и другие запуски, берет
+# блокировку 'crawl' и не продолжает запуск, пока выполняется другой
+def resume_crawl_run(run_id=None, processes=1):
+    with job_lock('crawl') as acquired:
+        if not acquired:
+            logging.warning("Запуск не продолжен: блокировку 'crawl' держит другой запуск")
+            return False
+
+        with psycopg2.connect(**db_config) as conn:
+            create_crawl_tables(conn)
+            run = get_crawl_run(conn, run_id, statuses=('running', 'incomplete'))
+            if run is None:
+                logging.info("Нет незавершенных запусков обхода.")
+                return False
+
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (zlib.crc32(b"hh_crawl_runs"),))
+                cursor.execute("SELECT status FROM crawl_runs WHERE id = %s", (run[0],))
+                status = cursor.fetchone()[0]
+                live_run_id = get_live_crawl_run(cursor)
+            if status not in ('running', 'incomplete'):
+                conn.rollback()
+                logging.warning(f"Запуск {run[0]} в статусе '{status}', продолжить его нельзя.")
+                return False
+            if live_run_id is not None and live_run_id != run[0]:
+                conn.rollback()
+                logging.warning(f"Запуск {live_run_id} еще выполняется, запуск {run[0]} не продолжен.")
+                return False
 
-# Функция для удаления дубликотов на основе столбца «url»
-def remove_duplicates():
+            with conn.cursor() as cursor:
+                cursor.execute("UPDATE crawl_runs SET status = 'running' WHERE id = %s", (run[0],))
+            released = release_crawl_units(conn, run[0])
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT
+                        (SELECT COUNT(*) FROM crawl_units WHERE run_id = %s AND status = 'pending'),
+                        (SELECT COUNT(*) FROM crawl_checkpoints c JOIN crawl_units u ON u.id = c.unit_id
+                         WHERE u.run_id = %s)
+                """, (run[0], run[0]))
+                pending_units, done_pages = cursor.fetchone()
+            conn.commit()
+
+        logging.info(f"Продолжение запуска {run[0]}: пар в очереди {pending_units} (возвращено {released}), "
+                     f"уже записано страниц {done_pages}.")
+        return run_crawl_workers(run[0], processes)
+
+# Функция для получения времени начала последнего завершенного запуска обхода
+def last_crawl_started_at(conn):
+    create_crawl_tables(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT MAX(started_at) FROM crawl_runs WHERE status = 'finished'")
+        return cursor.fetchone()[0]
+
+# Функция для парсинга вакансий: в инкрементальном режиме таблица не удаляется,
+# детали запрашиваются только для новых и измененных вакансий. С new_only ищутся только
+# вакансии, опубликованные после начала предыдущего завершенного запуска (инкрементально,
+# без архивирования пропавших); до первого завершенного запуска обходится вся выдача
+def parse_vacancies(incremental=False, new_only=False):
     with psycopg2.connect(**db_config) as conn:
-        cursor = conn.cursor()
+        search_from = last_crawl_started_at(conn) if new_only else None
+        if search_from is not None:
+            search_from = search_from.replace(microsecond=0) - timedelta(seconds=crawl_config['new_postings_overlap'])
+            logging.info(f"Обход вакансий, опубликованных после {search_from:%Y-%m-%d %H:%M:%S %Z}")
+        run_id = start_crawl_run(conn, incremental or new_only, search_from)
+    if run_id is None:
+        return None
+
+    if not run_crawl_workers(run_id, shard_config['processes']):
+        logging.warning(f"Запуск {run_id} не завершен, продолжить его можно командой: python main.py --resume")
+        return False
+    logging.info("Парсинг завершен. Данные сохранены в базе данных PostgreSQL.")
+    return True
+
+# Столбцы выгрузки; city и published_date задают разбиение снимка на каталоги
+export_columns = (
+    'hh_id', 'city', 'published_date', 'company', 'industry', 'title', 'keywords', 'skills', 'experience',
+    'experience_level', 'salary_from', 'salary_to', 'salary_currency', 'salary_gross', 'salary_from_rub',
+    'salary_to_rub', 'url', 'published_at', 'source_updated_at', 'first_seen_at', 'last_seen_at', 'archived',
+    'archived_at', 'updated_at'
+)
+
+# Порядок строк совпадает с индексом vacancies_city_published_at, поэтому строки одного
+# разбиения идут подряд и в каждый момент открыт только один файл
+export_query = """
+    SELECT
+        v.hh_id, v.city, (v.published_at AT TIME ZONE 'UTC')::DATE AS published_date, e.name, i.name, v.title,
+        v.keywords,
+        ARRAY(SELECT s.name FROM vacancy_skills vs JOIN skills s ON s.id = vs.skill_id
+              WHERE vs.vacancy_id = v.hh_id ORDER BY s.name),
+        v.experience, v.experience_level, v.salary_from, v.salary_to, v.salary_currency, v.salary_gross,
+        v.salary_from_rub, v.salary_to_rub, v.url, v.published_at,
+        v.source_updated_at, v.first_seen_at, v.last_seen_at, v.archived, v.archived_at, v.updated_at
+    FROM vacancies v
+    LEFT JOIN employers e ON e.id = v.employer_id
+    LEFT JOIN industries i ON i.id = e.industry_id
+    WHERE %(since)s::TIMESTAMPTZ IS NULL OR v.updated_at >= %(since)s
+    ORDER BY v.city, v.published_at
+"""
+
+# Функция для преобразования значений, которые json не сериализует сам
+def export_json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Неподдерживаемый тип: {type(value)}")
+
+def open_export_file(path, compression):
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+# Файл разбиения в формате CSV; навыки записываются одной строкой через запятую
+class CsvExportFile:
+    extension = 'csv'
+
+    def __init__(self, path, compression):
+        self.file = open_export_file(path, compression)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(export_columns)
+
+    def write(self, rows):
+        skills = export_columns.index('skills')
+        self.writer.writerows(row[:skills] + (', '.join(row[skills]),) + row[skills + 1:] for row in rows)
 
-        # Удалить дубликаты на основе столбца «url»
-        delete_duplicates_query = """
-            DELETE FROM vacancies
-            WHERE id NOT IN (
-                SELECT MIN(id)
-                FROM vacancies
-                GROUP BY url
+    def close(self):
+        self.file.close()
+
+# Файл разбиения в формате JSON Lines: один объект вакансии на строку
+class JsonlExportFile:
+    extension = 'jsonl'
+
+    def __init__(self, path, compression):
+        self.file = open_export_file(path, compression)
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(dict(zip(export_columns, row)), ensure_ascii=False, default=export_json_value))
+            self.file.write('\n')
+
+    def close(self):
+        self.file.close()
+
+# Файл разбиения в формате Parquet; каждая запись - отдельная группа строк. Столбцы
+# разбиения (city, published_date) хранятся только в именах каталогов, как принято для Hive
+class ParquetExportFile:
+    extension = 'parquet'
+    partition_columns = ('city', 'published_date')
+
+    def __init__(self, path, compression):
+        string = pyarrow.string()
+        timestamp = pyarrow.timestamp('us', tz='UTC')
+        types = {
+            'hh_id': pyarrow.int64(), 'skills': pyarrow.list_(string), 'salary_from': pyarrow.float64(),
+            'salary_to': pyarrow.float64(), 'salary_gross': pyarrow.bool_(), 'archived': pyarrow.bool_(),
+            'experience_level': pyarrow.int16(), 'salary_from_rub': pyarrow.float64(),
+            'salary_to_rub': pyarrow.float64(),
+            'published_at': timestamp, 'source_updated_at': timestamp, 'first_seen_at': timestamp,
+            'last_seen_at': timestamp, 'archived_at': timestamp, 'updated_at': timestamp
+        }
+        self.columns = [column for column in export_columns if column not in self.partition_columns]
+        self.schema = pyarrow.schema([(column, types.get(column, string)) for column in self.columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression=compression or 'none')
+
+    def write(self, rows):
+        data = {column: [] for column in self.columns}
+        for row in rows:
+            for column, value in zip(export_columns, row):
+                if column in data:
+                    data[column].append(float(value) if isinstance(value, Decimal) else value)
+        self.writer.write_table(pyarrow.Table.from_pydict(data, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+export_formats = {
+    'csv': CsvExportFile,
+    'jsonl': JsonlExportFile,
+    'parquet': ParquetExportFile
+}
+
+# Функция для создания таблицы снимков выгрузки
+def create_export_tables(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS export_snapshots (
+                id SERIAL PRIMARY KEY,
+                path VARCHAR(500) NOT NULL,
+                format VARCHAR(20) NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'running',
+                since TIMESTAMPTZ,
+                watermark TIMESTAMPTZ,
+                rows INTEGER,
+                files INTEGER,
+                started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                finished_at TIMESTAMPTZ
             )
-        """
-        cursor.execute(delete_duplicates_query)
+        """)
+    conn.commit()
+
+# Функция для получения отметки, с которой начнется следующая инкрементальная выгрузка:
+# начало самой старой открытой транзакции, иначе ее изменения (updated_at = начало транзакции)
+# станут видны только после этой выгрузки и не попадут ни в один снимок. Поэтому соседние
+# снимки могут пересекаться; актуальная версия вакансии - с наибольшим updated_at
+def export_watermark(cursor):
+    cursor.execute("""
+        SELECT LEAST(now(), MIN(xact_start)) FROM pg_stat_activity
+        WHERE datname = current_database() AND pid <> pg_backend_pid() AND xact_start IS NOT NULL
+    """)
+    return cursor.fetchone()[0]
+
+# Функция для записи строк курсора в файлы разбиений каталога directory; возвращает (строк, файлов)
+def write_export_files(cursor, directory, export_file, compression, batch_size):
+    extension = export_file.extension
+    if compression == 'gzip' and export_file is not ParquetExportFile:
+        extension += '.gz'
+
+    rows_written = 0
+    files = 0
+    partition = None
+    output = None
+    buffer = []
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            for row in rows:
+                key = (row[1], row[2])
+                if buffer and (key != partition or len(buffer) >= batch_size):
+                    output.write(buffer)
+                    buffer = []
+                if key != partition:
+                    if output is not None:
+                        output.close()
+                    partition = key
+                    city, published_date = (quote(str(value), safe='') if value is not None
+                                            else '__HIVE_DEFAULT_PARTITION__' for value in key)
+                    partition_dir = os.path.join(directory, f"city={city}", f"published_date={published_date}")
+                    os.makedirs(partition_dir, exist_ok=True)
+                    output = export_file(os.path.join(partition_dir, f"part-0.{extension}"), compression)
+                    files += 1
+                buffer.append(row)
+            rows_written += len(rows)
+            metrics.inc('hh_export_rows_total', len(rows), format=export_file.extension)
+            if len(rows) < batch_size:
+                break
+        if buffer:
+            output.write(buffer)
+    finally:
+        if output is not None:
+            output.close()
+    return rows_written, files
+
+# Функция для выгрузки вакансий в файлы: строки читаются серверным курсором порциями
+# по batch_size и раскладываются по каталогам city=<город>/published_date=<дата>.
+# Инкрементальная выгрузка содержит только строки, измененные после предыдущего снимка
+# того же каталога и формата. Снимок пишется во временный каталог и публикуется переименованием
+@metrics.timed('hh_export_seconds')
+def export_vacancies(export_format=None, path=None, incremental=False):
+    export_format = export_format or export_config['format']
+    path = os.path.abspath(path or export_config['path'])
+    compression = export_config['compression']
+    batch_size = export_config['batch_size']
+    if export_format == 'parquet' and pyarrow is None:
+        raise RuntimeError("Для выгрузки в Parquet установите pyarrow: pip install pyarrow")
+    export_file = export_formats[export_format]
 
+    with contextlib.closing(psycopg2.connect(**db_config)) as conn:
+        create_table(conn)
+        create_export_tables(conn)
+        with conn.cursor() as cursor:
+            since = None
+            if incremental:
+                cursor.execute("""
+                    SELECT watermark FROM export_snapshots
+                    WHERE path = %s AND format = %s AND status = 'finished'
+                    ORDER BY id DESC LIMIT 1
+                """, (path, export_format))
+                row = cursor.fetchone()
+                since = row[0] if row is not None else None
+            cursor.execute(
+                "INSERT INTO export_snapshots (path, format, since) VALUES (%s, %s, %s) RETURNING id",
+                (path, export_format, since)
+            )
+            snapshot_id = cursor.fetchone()[0]
+        conn.commit()
+
+        directory = os.path.join(path, f"snapshot={snapshot_id}")
+        temporary_directory = directory + '.tmp'
+        try:
+            with conn.cursor() as cursor:
+                watermark = export_watermark(cursor)
+            with conn.cursor(name=f"export_{snapshot_id}") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(export_query, {'since': since})
+                rows, files = write_export_files(cursor, temporary_directory, export_file, compression, batch_size)
+            conn.commit()
+            os.makedirs(temporary_directory, exist_ok=True)
+            os.rename(temporary_directory, directory)
+        except Exception:
+            conn.rollback()
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+            with conn.cursor() as cursor:
+                cursor.execute("UPDATE export_snapshots SET status = 'failed', finished_at = now() WHERE id = %s",
+                               (snapshot_id,))
+            conn.commit()
+            raise
+
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE export_snapshots
+                SET status = 'finished', watermark = %s, rows = %s, files = %s, finished_at = now()
+                WHERE id = %s
+            """, (watermark, rows, files, snapshot_id))
         conn.commit()
-        cursor.close()
 
-    logging.info("Дубликаты в таблице 'vacancies' успешно удалены.")
+    logging.info(f"Выгрузка {snapshot_id} ({export_format}{', только изменения' if since else ''}): "
+                 f"строк {rows}, файлов {files}, каталог {directory}")
+    return directory
 
 
-def run_parsing_job():
-    logging.info("Запуск парсинга...")
+# Функция для запуска парсинга с учетом метрик; new_only - обход только новых вакансий. Парсинг
+# выполняется под блокировкой 'crawl', как обходы планировщика; если ее держит другой процесс
+# или выполняется другой запуск, парсинг пропускается и возвращается None
+def run_parsing_job(incremental=None, new_only=False):
+    if incremental is None:
+        incremental = crawl_config['incremental']
+    mode = 'new' if new_only else 'incremental' if incremental else 'full'
+    mode_names = {'new': 'только новые вакансии', 'incremental': 'инкрементальный', 'full': 'полный'}
+    logging.info(f"Запуск парсинга (режим: {mode_names[mode]})...")
 
+    started = time.monotonic()
+    result = 'ok'
     try:
-        parse_vacancies()
-        remove_duplicates()
+        with job_lock('crawl') as acquired:
+            if not acquired:
+                result = 'skipped'
+                logging.warning("Парсинг пропущен: блокировку 'crawl' держит другой запуск")
+            else:
+                finished = parse_vacancies(incremental, new_only)
+                if finished is None:
+                    result = 'skipped'
+                elif not finished:
+                    result = 'incomplete'
     except Exception as e:
+        result = 'error'
         logging.error(f"Ошибка при выполнении задачи парсинга: {e}")
+    metrics.inc('hh_runs_total', mode=mode, result=result)
+    if result == 'skipped':
+        return None
+    metrics.observe('hh_run_duration_seconds', time.monotonic() - started, mode=mode)
+    metrics.set('hh_last_run_timestamp_seconds', time.time(), mode=mode)
+    return result == 'ok'
+
+# Функция для оценки числа страниц выдачи при found найденных вакансиях с учетом разбиения
+# по датам: диапазоны делятся пополам, пока каждый не уместится в max_results
+def estimate_search_pages(found):
+    per_page = search_config['per_page']
+    max_results = search_config['max_results']
+    parts = 2 ** math.ceil(math.log2(found / max_results)) if found > max_results else 1
+    return parts * max(math.ceil(found / parts / per_page), 1) + parts - 1
+
+# Функция для оценки числа запросов к API и длительности запуска без записи в базу данных.
+# С probe по каждой паре (город, запрос) запрашивается первая страница выдачи с числом найденных
+# вакансий, без него считается верхняя граница - полная выдача max_results на пару
+def estimate_requests(probe=True):
+    totals = collections.Counter()
+    open_http_cache()
+    try:
+        for city, city_id in cities.items():
+            for vacancy in vacancies:
+                found = get_vacancies(city_id, vacancy, 0).get('found', 0) if probe else search_config['max_results']
+                search_pages = estimate_search_pages(found)
+                totals['found'] += found
+                totals['search'] += search_pages
+                totals['vacancy'] += found
+                if probe:
+                    print(f"{city}\t{vacancy}\tнайдено {found}\tстраниц выдачи {search_pages}")
+    finally:
+        close_http_cache()
+
+    seconds = max(totals[endpoint] / rate_limit_config['endpoints'][endpoint]['rate']
+                  for endpoint in ('search', 'vacancy'))
+    print(f"Пар (город, запрос): {len(cities) * len(vacancies)}, найдено вакансий: "
+          f"{'' if probe else 'до '}{totals['found']}")
+    print(f"Запросов к API: выдача {totals['search']}, детали вакансий до {totals['vacancy']} "
+          f"(меньше в инкрементальном режиме и при пересечении запросов), работодатели - по числу новых")
+    print(f"Длительность при начальных лимитах частоты: около {seconds / 60:.1f} мин")
+    if totals['search'] + totals['vacancy'] > fetch_config['request_budget'] * shard_config['processes']:
+        print(f"Превышен бюджет запросов fetch_config['request_budget'] = {fetch_config['request_budget']} "
+              f"на процесс: часть пар останется незавершенной")
+    return totals
+
+
+# Функция для планового обновления кэша отраслей работодателей: заново запрашиваются записи
+# старше refresh_age (не больше refresh_limit), изменившиеся отрасли переносятся в таблицу employers,
+# поэтому обходы вакансий берут отрасли из кэша, не тратя на них запросы
+def refresh_employer_cache():
+    def refresh(employer_id):
+        try:
+            return load_industry(employer_id)
+        except requests.RequestException as e:
+            logging.warning(f"Не удалось обновить отрасль работодателя {employer_id}: {e}")
+            return None
+
+    cache = open_employer_cache()
+    open_http_cache()
+    try:
+        employer_ids = cache.stale(employer_cache_config['refresh_age'], employer_cache_config['refresh_limit'])
+        with ThreadPoolExecutor(max_workers=fetch_config['concurrency']) as executor:
+            industries = dict(zip(employer_ids, executor.map(refresh, employer_ids)))
+    finally:
+        close_employer_cache()
+        close_http_cache()
+    metrics.inc('hh_employer_refresh_total', len(employer_ids))
+
+    known = {employer_id: industry for employer_id, industry in industries.items()
+             if industry not in (None, 'Unknown') and employer_id.isdigit()}
+    with psycopg2.connect(**db_config) as conn:
+        with conn.cursor() as cursor:
+            industry_ids = upsert_names(cursor, 'industries', known.values())
+            psycopg2.extras.execute_values(cursor, """
+                UPDATE employers e SET industry_id = d.industry_id
+                FROM (VALUES %s) AS d (hh_id, industry_id)
+                WHERE e.hh_id = d.hh_id AND e.industry_id IS DISTINCT FROM d.industry_id
+            """, [(int(employer_id), industry_ids[industry]) for employer_id, industry in known.items()])
+            updated = cursor.rowcount
+        conn.commit()
+    logging.info(f"Кэш работодателей обновлен: запрошено {len(employer_ids)}, "
+                 f"ошибок {sum(industry is None for industry in industries.values())}, "
+                 f"изменена отрасль у {max(updated, 0)}")
+    return True
 
+# Задачи планировщика по именам из scheduler_config; функция возвращает False при неуспехе
+# и None, если задача пропущена
+scheduled_jobs = {
+    'new_postings': functools.partial(run_parsing_job, new_only=True),
+    'all_postings': run_parsing_job,
+    'employer_cache': refresh_employer_cache
+}
+
+# Функция для создания таблицы истории запусков задач планировщика
+def create_scheduler_tables(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS job_runs (
+                id SERIAL PRIMARY KEY,
+                job VARCHAR(50) NOT NULL,
+                host VARCHAR(100) NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'running',
+                started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                finished_at TIMESTAMPTZ,
+                duration DOUBLE PRECISION,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS job_runs_job_started_at ON job_runs (job, started_at);
+        """)
+    conn.commit()
+
+# Блокировки задач, которые держит текущий поток: обход планировщика под блокировкой 'crawl'
+# вызывает run_parsing_job, который берет ту же блокировку
+job_locks_held = threading.local()
+
+# Функция-контекст для advisory-блокировки lock на время выполнения: блокировка сессии держится,
+# пока открыто соединение, и снимается PostgreSQL, если процесс упал. Возвращает, получена ли
+# блокировка; в потоке, который ее уже держит, блокировка не запрашивается повторно
+@contextlib.contextmanager
+def job_lock(lock):
+    held = job_locks_held.__dict__.setdefault('locks', set())
+    if lock is None or lock in held:
+        yield True
+        return
+
+    conn = psycopg2.connect(**db_config)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (zlib.crc32(f"hh_scheduler:{lock}".encode()),))
+            acquired = cursor.fetchone()[0]
+        conn.commit()
+        if not acquired:
+            yield False
+            return
+        held.add(lock)
+        try:
+            yield True
+        finally:
+            held.discard(lock)
+    finally:
+        conn.close()
+
+# Функция для выполнения задачи планировщика под блокировкой lock (см. job_lock). Если блокировку
+# держит другой запуск, задача пропускается; запуск записывается в job_runs с длительностью
+def run_scheduled_job(name, lock=None):
+    with job_lock(lock) as acquired:
+        conn = psycopg2.connect(**db_config)
+        try:
+            create_scheduler_tables(conn)
+            with conn.cursor() as cursor:
+                if not acquired:
+                    cursor.execute(
+                        "INSERT INTO job_runs (job, host, status, finished_at, duration) VALUES (%s, %s, 'skipped', now(), 0)",
+                        (name, socket.gethostname())
+                    )
+                    conn.commit()
+                    metrics.inc('hh_job_runs_total', job=name, status='skipped')
+                    logging.warning(f"Задача '{name}' пропущена: блокировку '{lock}' держит другой запуск")
+                    return False
+                cursor.execute("INSERT INTO job_runs (job, host) VALUES (%s, %s) RETURNING id", (name, socket.gethostname()))
+                job_run_id = cursor.fetchone()[0]
+            conn.commit()
+
+            logging.info(f"Задача '{name}' запущена")
+            started = time.monotonic()
+            status, error = 'ok', None
+            try:
+                result = scheduled_jobs[name]()
+                if result is None:
+                    status = 'skipped'
+                elif not result:
+                    status = 'error'
+            except Exception as e:
+                status, error = 'error', str(e)
+                logging.error(f"Ошибка при выполнении задачи '{name}': {e}")
+            duration = time.monotonic() - started
+
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE job_runs SET status = %s, finished_at = now(), duration = %s, error = %s WHERE id = %s",
+                    (status, duration, error, job_run_id)
+                )
+            conn.commit()
+            metrics.inc('hh_job_runs_total', job=name, status=status)
+            metrics.observe('hh_job_duration_seconds', duration, job=name)
+            logging.info(f"Задача '{name}' завершена ({status}) за {duration:.1f} с")
+            return status == 'ok'
+        finally:
+            conn.close()
+
+weekdays = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# Функция для расчета ближайшего после now времени запуска задачи с периодом every и временем at
+def next_run_time(every, at, now):
+    if every == 'hour':
+        candidate = now.replace(minute=int(at.lstrip(':')), second=0, microsecond=0)
+        step = timedelta(hours=1)
+    elif every == 'day':
+        hour, minute = map(int, at.split(':'))
+        candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        step = timedelta(days=1)
+    elif every == 'week':
+        day, clock = at.split()
+        hour, minute = map(int, clock.split(':'))
+        candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        candidate += timedelta(days=(weekdays.index(day.lower()) - now.weekday()) % 7)
+        step = timedelta(weeks=1)
+    else:
+        raise ValueError(f"Неизвестный период задачи: {every}")
+    while candidate <= now:
+        candidate += step
+    return candidate
+
+# Задача планировщика: ждет своего времени (со случайной задержкой) и запускает выполнение
+# в отдельном потоке, не ожидая его окончания; сверх concurrency запуски пропускаются
+class ScheduledJob:
+    def __init__(self, name, every, at, jitter=0, concurrency=1, lock=None, enabled=True):
+        if name not in scheduled_jobs:
+            raise ValueError(f"Неизвестная задача планировщика: {name}")
+        self.name = name
+        self.every = every
+        self.at = at
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.lock = lock
+        self.enabled = enabled
+        self.running = 0
+        self.tasks = set()
+
+    async def loop(self):
+        while True:
+            now = datetime.now()
+            due = next_run_time(self.every, self.at, now)
+            delay = (due - now).total_seconds() + random.uniform(0, self.jitter)
+            logging.info(f"Задача '{self.name}': следующий запуск {due:%Y-%m-%d %H:%M} "
+                         f"(задержка до {self.jitter} с)")
+            await asyncio.sleep(delay)
+
+            if self.running >= self.concurrency:
+                metrics.inc('hh_job_runs_total', job=self.name, status='skipped')
+                logging.warning(f"Задача '{self.name}' пропущена: выполняется запусков {self.running}")
+                continue
+            self.running += 1
+            task = asyncio.ensure_future(self.run())
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def run(self):
+        try:
+            await asyncio.to_thread(run_scheduled_job, self.name, self.lock)
+        except Exception as e:
+            logging.error(f"Ошибка при запуске задачи '{self.name}': {e}")
+        finally:
+            self.running -= 1
 
 # Планировщик задач
-schedule.every().day.at("12:00").do(run_parsing_job)
+async def schedule_jobs():
+    jobs = [ScheduledJob(name, **spec) for name, spec in scheduler_config['jobs'].items()]
+    jobs = [job for job in jobs if job.enabled]
+    logging.info(f"Планировщик запущен, задачи: {', '.join(job.name for job in jobs)}")
+    await asyncio.gather(*(job.loop() for job in jobs))
+
+def run_scheduler():
+    asyncio.run(schedule_jobs())
+
+
+# Функция для запуска из командной строки: команды run-once (один запуск), daemon (задачи по расписанию,
+# по умолчанию), run-job (одна задача планировщика сейчас) и dry-run (оценка числа запросов),
+# а также служебные флаги распределенного обхода
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Парсер вакансий HeadHunter')
+    parser.add_argument('--config', help='файл конфигурации .toml, .yaml или .json (по умолчанию - из HH_CONFIG)')
+    parser.add_argument('--enqueue', action='store_true',
+                        help='создать запуск распределенного обхода и поставить пары (город, запрос) в очередь')
+    parser.add_argument('--full', action='store_true',
+                        help='вместе с --enqueue или run-once: полная перезагрузка таблицы вместо инкрементального режима')
+    parser.add_argument('--worker', action='store_true',
+                        help='обрабатывать пары из очереди (по умолчанию - последнего незавершенного запуска)')
+    parser.add_argument('--resume', action='store_true',
+                        help='продолжить незавершенный запуск с последней записанной страницы')
+    parser.add_argument('--run-id', type=int, help='вместе с --worker или --resume: id запуска')
+    parser.add_argument('--processes', type=int,
+                        help='вместе с --worker или --resume: число процессов-обработчиков (по умолчанию из shard_config)')
+    parser.add_argument('--export', choices=sorted(export_formats), nargs='?', const=True,
+                        help='выгрузить вакансии в файлы (по умолчанию - в формате из export_config)')
+    parser.add_argument('--export-path', help='вместе с --export: каталог выгрузки (по умолчанию из export_config)')
+    parser.add_argument('--changed-only', action='store_true',
+                        help='вместе с --export: только вакансии, измененные после предыдущей выгрузки')
+    parser.add_argument('--metrics-port', type=int,
+                        help='порт HTTP-эндпоинта /metrics в формате Prometheus (по умолчанию из metrics_config)')
+    commands = parser.add_subparsers(dest='command', metavar='команда')
+    run_once = commands.add_parser('run-once', help='выполнить один запуск парсинга и завершиться')
+    run_once.add_argument('--full', action='store_true', default=argparse.SUPPRESS,
+                          help='полная перезагрузка таблицы вместо инкрементального режима')
+    run_once.add_argument('--new-only', action='store_true',
+                          help='только вакансии, опубликованные после предыдущего завершенного запуска')
+    commands.add_parser('daemon', help='запускать задачи по расписанию из scheduler_config (по умолчанию)')
+    run_job = commands.add_parser('run-job', help='выполнить задачу планировщика сейчас, под ее блокировкой')
+    run_job.add_argument('job', choices=sorted(scheduled_jobs))
+    dry_run = commands.add_parser('dry-run', help='оценить число запросов к API без записи в базу данных')
+    dry_run.add_argument('--no-probe', action='store_true',
+                         help='не обращаться к API, посчитать верхнюю границу по настройкам')
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    load_config(args.config)
+    processes = args.processes or shard_config['processes']
+
+    if args.command == 'dry-run':
+        estimate_requests(probe=not args.no_probe)
+        return
+
+    start_metrics_server(args.metrics_port if args.metrics_port is not None else metrics_config['port'])
+    if args.command == 'run-once':
+        incremental = not args.full and crawl_config['incremental']
+        if not run_parsing_job(incremental, new_only=args.new_only):
+            sys.exit(1)
+    elif args.command == 'run-job':
+        if not run_scheduled_job(args.job, scheduler_config['jobs'].get(args.job, {}).get('lock')):
+            sys.exit(1)
+    elif args.enqueue:
+        with job_lock('crawl') as acquired:
+            if not acquired:
+                logging.warning("Запуск не создан: блокировку 'crawl' держит другой запуск")
+                sys.exit(1)
+            with psycopg2.connect(**db_config) as conn:
+                run_id = start_crawl_run(conn, incremental=not args.full and crawl_config['incremental'])
+        if run_id is None:
+            sys.exit(1)
+        print(run_id)
+    elif args.worker:
+        run_crawl_workers(args.run_id, processes)
+    elif args.resume:
+        resume_crawl_run(args.run_id, processes)
+    elif args.export:
+        export_format = export_config['format'] if args.export is True else args.export
+        export_vacancies(export_format, args.export_path or export_config['path'], incremental=args.changed_only)
+    else:
+        run_scheduler()
+
 
-while True:
-    schedule.run_pending()
-    time.sleep(1)
+if __name__ == '__main__':
+    main()